@@ -0,0 +1,218 @@
+"""Pool of pre-transcoded background videos for brainrot renders.
+
+Background footage is transcoded once into render-friendly intermediates (fixed
+resolution and fps, a short keyframe interval, no audio) listed in a manifest
+with their durations. A render then picks a clip from the manifest and decodes
+only the segment it needs, instead of opening and decoding the original
+footage in full.
+
+Prepare the pool (again after adding footage to static/backgrounds), or add
+single videos to it:
+    python backgrounds.py [video ...]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Used when no pool has been prepared
+DEFAULT_BACKGROUND = os.path.join("static", "input.mov")
+# Footage transcoded by default, in addition to DEFAULT_BACKGROUND
+BACKGROUND_SOURCE_DIR = os.getenv("BACKGROUND_SOURCE_DIR", os.path.join("static", "backgrounds"))
+BACKGROUND_DIR = os.getenv("BACKGROUND_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "backgrounds"))
+MANIFEST_NAME = "manifest.json"
+
+VIDEO_EXTENSIONS = (".mov", ".mp4", ".m4v", ".mkv", ".webm", ".avi")
+
+# Render settings of the intermediates; a keyframe every half second keeps seeks cheap
+BACKGROUND_SETTINGS = {
+    "width": int(os.getenv("BACKGROUND_WIDTH", "1080")),
+    "height": int(os.getenv("BACKGROUND_HEIGHT", "1920")),
+    "fps": int(os.getenv("BACKGROUND_FPS", "30")),
+    "keyframe_seconds": 0.5,
+}
+
+_manifest: Dict[str, Any] = {}
+_manifest_mtime: Optional[float] = None
+
+
+def get_manifest_path() -> str:
+    return os.path.join(BACKGROUND_DIR, MANIFEST_NAME)
+
+
+def load_manifest() -> Dict[str, Any]:
+    """Returns the pool manifest, re-reading it after the pool is prepared again."""
+    global _manifest, _manifest_mtime
+    path = get_manifest_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if mtime != _manifest_mtime:
+        with open(path, encoding="utf-8") as f:
+            _manifest = json.load(f)
+        _manifest_mtime = mtime
+        logger.info(f"Loaded {len(_manifest.get('clips', []))} background clips from {path}")
+    return _manifest
+
+
+def select_background(duration: float, seed: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Picks a pooled clip and a segment start for a render of ``duration`` seconds.
+
+    The same seed (e.g. a document ID) always gets the same background. Falls back
+    to DEFAULT_BACKGROUND from the start when no pool is prepared; returns None if
+    there is no background at all.
+    """
+    clips = [clip for clip in load_manifest().get("clips", [])
+             if os.path.exists(os.path.join(BACKGROUND_DIR, clip["file"]))]
+    if not clips:
+        if not os.path.exists(DEFAULT_BACKGROUND):
+            return None
+        logger.info("No background pool prepared, using the default background")
+        return {"path": DEFAULT_BACKGROUND, "start": 0.0, "duration": None}
+
+    rng = random.Random(seed)
+    clip = rng.choice(clips)
+    # Any start that leaves room for the whole render; shorter clips are looped from 0
+    start = rng.uniform(0, clip["duration"] - duration) if clip["duration"] > duration else 0.0
+    return {"path": os.path.join(BACKGROUND_DIR, clip["file"]), "start": start, "duration": clip["duration"]}
+
+
+def load_background(background: Dict[str, Any], duration: float):
+    """Opens the selected segment of a background as a silent clip of exactly ``duration`` seconds."""
+    from moviepy.editor import VideoFileClip
+    import moviepy.video.fx.all as vfx
+
+    # The reader seeks straight to the segment start instead of decoding from the beginning
+    clip = VideoFileClip(background["path"], audio=False)
+    start = background["start"]
+    if clip.duration - start >= duration:
+        return clip.subclip(start, start + duration)
+    return clip.subclip(start).fx(vfx.loop, duration=duration)
+
+
+def find_sources(source_dir: str = BACKGROUND_SOURCE_DIR) -> List[str]:
+    sources = []
+    if os.path.isdir(source_dir):
+        sources = [os.path.join(source_dir, name) for name in sorted(os.listdir(source_dir))
+                   if name.lower().endswith(VIDEO_EXTENSIONS)]
+    if os.path.exists(DEFAULT_BACKGROUND):
+        sources.insert(0, DEFAULT_BACKGROUND)
+    return sources
+
+
+def get_intermediate_name(source: str) -> str:
+    """Names an intermediate after its source file version and the render settings."""
+    source_stat = os.stat(source)
+    key = json.dumps([os.path.abspath(source), source_stat.st_size, source_stat.st_mtime, BACKGROUND_SETTINGS])
+    return f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.mp4"
+
+
+def transcode_background(source: str, output_path: str):
+    """Transcodes footage into a render-friendly intermediate with ffmpeg."""
+    from imageio_ffmpeg import get_ffmpeg_exe
+
+    width, height, fps = BACKGROUND_SETTINGS["width"], BACKGROUND_SETTINGS["height"], BACKGROUND_SETTINGS["fps"]
+    gop = max(1, round(fps * BACKGROUND_SETTINGS["keyframe_seconds"]))
+    temp_path = output_path + ".part.mp4"
+    command = [
+        get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", source,
+        "-an",
+        # Fill the frame, cropping rather than letterboxing
+        "-vf", f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+               f"crop={width}:{height},setsar=1,fps={fps}",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-pix_fmt", "yuv420p",
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-movflags", "+faststart",
+        temp_path,
+    ]
+    logger.info(f"Transcoding background {source} to {output_path}")
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise RuntimeError(f"ffmpeg failed for {source}: {e.stderr.decode('utf-8', 'replace').strip()}")
+    os.replace(temp_path, output_path)
+
+
+def prepare_backgrounds(sources: List[str], replace: bool = False) -> Dict[str, Any]:
+    """Transcodes new or changed footage and writes the pool manifest.
+
+    The sources are added to the pool, replacing earlier versions of the same
+    files; with ``replace`` they become the whole pool. Intermediates that are
+    already up to date are reused; ones no longer in the manifest are removed.
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    if not os.path.exists(BACKGROUND_DIR):
+        os.makedirs(BACKGROUND_DIR)
+
+    previous_clips = load_manifest().get("clips", [])
+    previous = {clip["file"]: clip for clip in previous_clips}
+    clips = []
+    if not replace:
+        updated = {os.path.abspath(source) for source in sources}
+        clips = [clip for clip in previous_clips if os.path.abspath(clip["source"]) not in updated]
+    for source in sources:
+        name = get_intermediate_name(source)
+        output_path = os.path.join(BACKGROUND_DIR, name)
+        if name in previous and os.path.exists(output_path):
+            logger.info(f"Background {source} is up to date")
+            clips.append(previous[name])
+            continue
+        with stage("background_transcode"):
+            transcode_background(source, output_path)
+        clips.append({
+            "file": name,
+            "source": source,
+            "duration": ffmpeg_parse_infos(output_path)["duration"],
+            **BACKGROUND_SETTINGS,
+        })
+
+    manifest = {"clips": clips}
+    manifest_path = get_manifest_path()
+    with open(manifest_path + ".part", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".part", manifest_path)
+
+    current = {clip["file"] for clip in clips}
+    for name in os.listdir(BACKGROUND_DIR):
+        if name.endswith(".mp4") and name not in current:
+            os.unlink(os.path.join(BACKGROUND_DIR, name))
+            logger.info(f"Removed stale background {name}")
+
+    logger.info(f"Background pool has {len(clips)} clips in {BACKGROUND_DIR}")
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Transcode background footage into the brainrot render pool")
+    parser.add_argument("sources", nargs="*",
+                        help=f"videos to add to the pool (default: rebuild it from {DEFAULT_BACKGROUND} "
+                             f"and {BACKGROUND_SOURCE_DIR}/*)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    sources = args.sources or find_sources()
+    if not sources:
+        print(f"No background videos found in {BACKGROUND_SOURCE_DIR} or at {DEFAULT_BACKGROUND}", file=sys.stderr)
+        return 1
+    # Only a rebuild from the default footage drops clips that aren't listed
+    manifest = prepare_backgrounds(sources, replace=not args.sources)
+    for clip in manifest["clips"]:
+        print(f"{clip['file']}: {clip['source']} ({clip['duration']:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,458 @@
+"""Offline end-to-end benchmark for the backend.
+
+Runs the FastAPI app in-process against local stand-ins for arXiv (canned PDF),
+Gemini (scripted responses) and ElevenLabs (silent MP3s), with configurable
+latency and 429 injection, so performance changes can be measured repeatably
+without network access or API keys.
+
+Example:
+    python benchmark.py --endpoints query,podcast --requests 20 --concurrency 4
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WORDS = ("model", "training", "data", "attention", "layer", "results", "baseline", "gradient",
+         "network", "evaluation", "dataset", "loss", "transformer", "benchmark", "accuracy", "method")
+
+# Duration of synthesized speech per character of dialogue text
+MS_PER_CHAR = 60
+
+# One MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, all-zero side info and main data (silence)
+MP3_SILENT_FRAME = b"\xff\xfb\x90\xc4" + b"\x00" * 413
+MP3_FRAME_MS = 1152 / 44.1
+
+
+def canned_pdf(pages: int = 8, lines_per_page: int = 45, words_per_line: int = 12, seed: Any = 0) -> bytes:
+    """Builds a small text PDF that PyPDF2 can extract; different seeds give different papers."""
+    rng = random.Random(seed)
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for page in range(pages):
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        lines = [" ".join(rng.choice(WORDS) for _ in range(words_per_line)) for _ in range(lines_per_page)]
+        stream = b"BT /F1 10 Tf 12 TL 50 760 Td " + b" ".join(b"(%s) Tj T*" % line.encode() for line in lines) + b" ET"
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(b"%d 0 R" % page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for object_id in range(1, len(objects) + 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+def silent_mp3(duration_ms: float) -> bytes:
+    return MP3_SILENT_FRAME * max(1, int(duration_ms / MP3_FRAME_MS))
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """Serves a canned paper per path for any GET (arXiv) and silent speech for POST /tts/<voice_id> (ElevenLabs)."""
+
+    pdf_pages = 8
+    arxiv_latency = 0.0
+    arxiv_rate_limit = 0.0
+    tts_latency = 0.0
+    tts_rate_limit = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _throttled(self, latency: float, rate_limit: float) -> bool:
+        time.sleep(latency)
+        if random.random() < rate_limit:
+            self._send(429, "application/json", b'{"detail": "rate limited"}')
+            return True
+        return False
+
+    def do_GET(self):
+        if not self._throttled(self.arxiv_latency, self.arxiv_rate_limit):
+            self._send(200, "application/pdf", canned_pdf(pages=self.pdf_pages, seed=self.path))
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self._throttled(self.tts_latency, self.tts_rate_limit):
+            self._send(200, "audio/mpeg", silent_mp3(len(body.get("text", "")) * MS_PER_CHAR))
+
+
+class FakeUpstream:
+    """Local HTTP server standing in for arXiv and ElevenLabs."""
+
+    def __init__(self, args):
+        handler = type("Handler", (FakeUpstreamHandler,), {
+            "pdf_pages": args.pdf_pages,
+            "arxiv_latency": args.arxiv_latency,
+            "arxiv_rate_limit": args.arxiv_rate_limit,
+            "tts_latency": args.tts_latency,
+            "tts_rate_limit": args.tts_rate_limit,
+        })
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+class FakeGeminiModels:
+    """Scripted stand-in for ``client.models`` and ``client.aio.models``."""
+
+    def __init__(self, latency: float, rate_limit: float, dialogue_lines: int, stream_chunks: int = 20):
+        # Imported here, before anything is timed, rather than inside the llm stage of the first 429
+        from google.genai import errors
+
+        self.errors = errors
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.dialogue_lines = dialogue_lines
+        self.stream_chunks = stream_chunks
+        self.counter = itertools.count()
+
+    def _check_rate_limit(self):
+        if random.random() < self.rate_limit:
+            raise self.errors.ClientError(429, {"error": {"code": 429, "message": "Resource exhausted",
+                                                      "status": "RESOURCE_EXHAUSTED"}})
+
+    def _respond(self, contents: Any) -> str:
+        prompt = str(contents)
+        # Number every response so TTS clips are never served from the clip cache
+        n = next(self.counter)
+        if "<dialogue>" in prompt:
+            dialogue = []
+            for i in range(self.dialogue_lines):
+                line = {"speaker": ("Jessica", "Michael")[i % 2],
+                        "text": f"Benchmark run {n}, line {i}: so the paper shows the model really works, you know?"}
+                if i % 3 == 1:
+                    line["overlaps"] = [{"speaker": "Jessica", "text": f"Run {n}, overlap {i}: right!"}]
+                dialogue.append(line)
+            return f"<scratchpad>Outline for run {n}</scratchpad>\n<dialogue>\n{json.dumps(dialogue, indent=2)}\n</dialogue>"
+        if "JSON array of strings" in prompt:
+            return "```json\n" + json.dumps([f"Hook {i} of run {n}" for i in range(10)]) + "\n```"
+        return f"Summary {n}: the paper proposes a method and evaluates it on a benchmark."
+
+    def generate_content(self, model: str, contents: Any, config: Any = None):
+        time.sleep(self.latency)
+        self._check_rate_limit()
+        return SimpleNamespace(text=self._respond(contents))
+
+
+class FakeAsyncGeminiModels:
+    def __init__(self, models: FakeGeminiModels):
+        self.models = models
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None):
+        await asyncio.sleep(self.models.latency)
+        self.models._check_rate_limit()
+        return SimpleNamespace(text=self.models._respond(contents))
+
+    async def generate_content_stream(self, model: str, contents: Any, config: Any = None):
+        self.models._check_rate_limit()
+        text = self.models._respond(contents)
+        chunks = self.models.stream_chunks
+        size = max(1, len(text) // chunks + 1)
+
+        async def stream():
+            for i in range(0, len(text), size):
+                await asyncio.sleep(self.models.latency / chunks)
+                yield SimpleNamespace(text=text[i:i + size])
+
+        return stream()
+
+
+class FakeGeminiClient:
+    def __init__(self, args):
+        self.models = FakeGeminiModels(args.gemini_latency, args.gemini_rate_limit, args.dialogue_lines)
+        self.aio = SimpleNamespace(models=FakeAsyncGeminiModels(self.models))
+
+
+# Modules that should only be loaded on first use, never when importing the app
+HEAVY_MODULES = ("moviepy", "pydub", "numpy", "PyPDF2", "google.genai", "voiceover")
+
+STARTUP_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_s": elapsed, "heavy_modules": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_startup(runs: int) -> Dict[str, Any]:
+    """Imports the app in fresh interpreters, as a new worker would, and times it."""
+    process_times, import_times, heavy_modules = [], [], set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        process_times.append(time.perf_counter() - start)
+        result = json.loads(output.strip().splitlines()[-1])
+        import_times.append(result["import_s"])
+        heavy_modules.update(result["heavy_modules"])
+    return {
+        "runs": runs,
+        "process_s": summarize(process_times),
+        "import_s": summarize(import_times),
+        "heavy_modules_loaded": sorted(heavy_modules),
+    }
+
+
+def current_rss() -> int:
+    """Current resident set size in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler(threading.Thread):
+    """Samples RSS and attributes each sample to the stages running at that moment."""
+
+    def __init__(self, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self.stage_peaks: Dict[str, int] = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        from metrics import STAGES_IN_PROGRESS
+
+        while not self.stopped.is_set():
+            rss = current_rss()
+            self.peak = max(self.peak, rss)
+            for metric in STAGES_IN_PROGRESS.collect():
+                for sample in metric.samples:
+                    if sample.value > 0:
+                        name = sample.labels["stage"]
+                        self.stage_peaks[name] = max(self.stage_peaks.get(name, 0), rss)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+def build_request(endpoint: str, paper_url: str, index: int) -> Dict[str, Any]:
+    # A different paper per request, so every request takes the cold (uncached) path
+    paper_id = f"2401.{index:05d}"
+    if endpoint == "query":
+        return {"url": "/query", "json": {"url": f"{paper_url}/pdf/{paper_id}", "is_arxiv": True}}
+    if endpoint == "podcast":
+        return {"url": "/generate_podcast", "json": {"url": f"{paper_url}/abs/{paper_id}", "is_arxiv": True}}
+    if endpoint == "brainrot":
+        return {"url": "/generate_brainrot", "data": {"request": json.dumps({"pdf_url": f"{paper_url}/pdf/{paper_id}"})}}
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def succeeded(endpoint: str, body: Dict[str, Any]) -> bool:
+    if endpoint == "query":
+        return not body.get("error")
+    return body.get("status") == "success"
+
+
+async def run_endpoint(app, endpoint: str, paper_url: str, total: int, concurrency: int) -> Dict[str, Any]:
+    """Sends ``total`` requests to one endpoint with at most ``concurrency`` in flight."""
+    import httpx
+
+    latencies: List[float] = []
+    stage_times: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    pending = iter(range(total))
+
+    async def worker(client):
+        for index in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post(**build_request(endpoint, paper_url, index))
+                body = response.json()
+                ok = response.status_code == 200 and succeeded(endpoint, body)
+                error = body.get("error") or f"HTTP {response.status_code}"
+            except Exception as e:
+                body, ok, error = {}, False, type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors[error] = errors.get(error, 0) + 1
+            for name, seconds in (body.get("timings") or {}).items():
+                stage_times.setdefault(name, []).append(seconds)
+
+    sampler = RssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+
+    return {
+        "endpoint": endpoint,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 3),
+        "latency_s": summarize(latencies),
+        "peak_rss_mb": round(sampler.peak / 2 ** 20, 1),
+        "stages": {
+            name: {**summarize(values), "peak_rss_mb": round(sampler.stage_peaks.get(name, 0) / 2 ** 20, 1)}
+            for name, values in stage_times.items()
+        },
+    }
+
+
+def provider_counters() -> Dict[str, float]:
+    from prometheus_client import REGISTRY
+
+    counters = {}
+    for metric in REGISTRY.collect():
+        if metric.name in ("researchrot_rate_limited", "researchrot_retries", "researchrot_cache_hits"):
+            for sample in metric.samples:
+                if sample.name.endswith("_total"):
+                    label = next(iter(sample.labels.values()))
+                    counters[f"{metric.name}{{{label}}}"] = sample.value
+    return counters
+
+
+def print_report(results: List[Dict[str, Any]], counters: Dict[str, float], startup: Optional[Dict[str, Any]] = None):
+    if startup:
+        print(f"\n== startup: {startup['runs']} cold imports")
+        print(f"import main: p50 {startup['import_s']['p50']} s, max {startup['import_s']['max']} s")
+        print(f"interpreter + import: p50 {startup['process_s']['p50']} s, max {startup['process_s']['max']} s")
+        print(f"heavy modules loaded at import: {', '.join(startup['heavy_modules_loaded']) or 'none'}")
+    for result in results:
+        latency = result["latency_s"]
+        print(f"\n== {result['endpoint']}: {result['requests']} requests, concurrency {result['concurrency']}")
+        print(f"throughput {result['throughput_rps']} req/s, peak RSS {result['peak_rss_mb']} MB, "
+              f"errors {sum(result['errors'].values())}")
+        for error, count in result["errors"].items():
+            print(f"  {count} x {error}")
+        print(f"{'stage':<14}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}{'max s':>10}{'peak RSS MB':>14}")
+        print(f"{'(request)':<14}{latency['p50']:>10}{latency['p95']:>10}{latency['p99']:>10}{latency['max']:>10}"
+              f"{result['peak_rss_mb']:>14}")
+        for name, stats in result["stages"].items():
+            print(f"{name:<14}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}"
+                  f"{stats['peak_rss_mb']:>14}")
+    if counters:
+        print("\n== counters")
+        for name, value in counters.items():
+            print(f"{name}: {value:g}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with local fake providers")
+    parser.add_argument("--endpoints", default="query,podcast",
+                        help="comma-separated endpoints to drive: query, podcast, brainrot (empty for none)")
+    parser.add_argument("--startup-runs", type=int, default=3,
+                        help="cold imports of the app to time in fresh interpreters (0 to skip)")
+    parser.add_argument("--requests", type=int, default=10, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=2, help="requests in flight per endpoint")
+    parser.add_argument("--pdf-pages", type=int, default=8, help="pages in the canned paper")
+    parser.add_argument("--dialogue-lines", type=int, default=8, help="lines in the scripted podcast dialogue")
+    parser.add_argument("--arxiv-latency", type=float, default=0.2, help="seconds per arXiv download")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="seconds per Gemini call")
+    parser.add_argument("--tts-latency", type=float, default=0.5, help="seconds per ElevenLabs call")
+    parser.add_argument("--arxiv-rate-limit", type=float, default=0.0, help="probability of an arXiv 429")
+    parser.add_argument("--gemini-rate-limit", type=float, default=0.0, help="probability of a Gemini 429")
+    parser.add_argument("--tts-rate-limit", type=float, default=0.0, help="probability of an ElevenLabs 429")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for 429 injection")
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logging")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+
+    # Measured before this process imports the app, in clean interpreters
+    startup = measure_startup(args.startup_runs) if args.startup_runs else None
+
+    with FakeUpstream(args) as upstream, tempfile.TemporaryDirectory() as audio_dir, \
+            tempfile.TemporaryDirectory() as document_dir:
+        # The app reads these at import time, so they must be set before importing it
+        os.environ["ELEVENLABS_API_URL"] = f"{upstream.url}/tts"
+        os.environ["AUDIO_DIR"] = audio_dir
+        os.environ["DOCUMENT_DIR"] = document_dir
+        os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+        os.environ.setdefault("ELEVENLABS_API_KEY", "offline-benchmark")
+        import main as app_module
+
+        if not args.verbose:
+            logging.disable(logging.INFO)
+        app_module.client = FakeGeminiClient(args)
+
+        results = []
+        for endpoint in filter(None, args.endpoints.split(",")):
+            results.append(asyncio.run(
+                run_endpoint(app_module.app, endpoint.strip(), upstream.url, args.requests, args.concurrency)
+            ))
+
+    counters = provider_counters()
+    print_report(results, counters, startup)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"args": vars(args), "startup": startup, "results": results, "counters": counters}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
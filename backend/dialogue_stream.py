@@ -0,0 +1,96 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+DIALOGUE_TAG = "<dialogue>"
+
+# Parser states
+SEEK_TAG = "seek_tag"
+SEEK_ARRAY = "seek_array"
+IN_ARRAY = "in_array"
+IN_OBJECT = "in_object"
+DONE = "done"
+
+
+class DialogueStreamParser:
+    """Incrementally extracts dialogue objects from a streamed podcast script.
+
+    Feed the model output chunk by chunk; every top-level object of the JSON
+    array inside ``<dialogue>`` is returned as soon as its closing brace arrives,
+    nested ``overlaps`` included. The full (cleaned) transcript is kept in ``text``.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.lines: List[Dict[str, Any]] = []
+        self._state = SEEK_TAG
+        self._pos = 0
+        self._start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == DONE
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consumes a chunk of model output and returns the newly completed dialogue objects."""
+        self.text += chunk.replace("*", "")
+        completed = []
+
+        while self._pos < len(self.text) and self._state != DONE:
+            if self._state == SEEK_TAG:
+                index = self.text.find(DIALOGUE_TAG, self._pos)
+                if index == -1:
+                    # Keep a possible partial tag at the end of the buffer
+                    self._pos = max(self._pos, len(self.text) - len(DIALOGUE_TAG) + 1)
+                    break
+                self._pos = index + len(DIALOGUE_TAG)
+                self._state = SEEK_ARRAY
+                continue
+
+            char = self.text[self._pos]
+
+            if self._state == SEEK_ARRAY:
+                if char == "[":
+                    self._state = IN_ARRAY
+                elif not char.isspace():
+                    # Not the dialogue block (e.g. the tag mentioned in prose)
+                    self._state = SEEK_TAG
+                    continue
+            elif self._state == IN_ARRAY:
+                if char == "{":
+                    self._state = IN_OBJECT
+                    self._start = self._pos
+                    self._depth = 1
+                elif char == "]":
+                    self._state = DONE
+                    logger.info(f"Dialogue stream complete with {len(self.lines)} lines")
+                elif not (char.isspace() or char == ","):
+                    raise json.JSONDecodeError("Unexpected character in dialogue array", self.text, self._pos)
+            elif self._state == IN_OBJECT:
+                if self._in_string:
+                    if self._escaped:
+                        self._escaped = False
+                    elif char == "\\":
+                        self._escaped = True
+                    elif char == '"':
+                        self._in_string = False
+                elif char == '"':
+                    self._in_string = True
+                elif char == "{":
+                    self._depth += 1
+                elif char == "}":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        line = json.loads(self.text[self._start:self._pos + 1])
+                        self.lines.append(line)
+                        completed.append(line)
+                        self._state = IN_ARRAY
+
+            self._pos += 1
+
+        return completed
@@ -0,0 +1,346 @@
+import hashlib
+import io
+import logging
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, Optional, TextIO
+
+from fastapi import HTTPException
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from metrics import CACHE_HITS, stage
+
+logger = logging.getLogger(__name__)
+
+# Uploaded and downloaded papers, stored as <sha256>.pdf with the extracted text
+# (<sha256>.txt) and generated artifacts (<sha256>.<name>) cached next to them
+DOCUMENT_DIR = os.getenv("DOCUMENT_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "documents"))
+if not os.path.exists(DOCUMENT_DIR):
+    os.makedirs(DOCUMENT_DIR)
+    logger.info(f"Created document directory: {DOCUMENT_DIR}")
+
+# Maps downloaded URLs to the document they resolved to
+URL_INDEX_DIR = os.path.join(DOCUMENT_DIR, "urls")
+if not os.path.exists(URL_INDEX_DIR):
+    os.makedirs(URL_INDEX_DIR)
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+DOCUMENT_ID_PATTERN = re.compile(r"[0-9a-f]{64}")
+PDF_SIGNATURE = b"%PDF"
+
+# Extraction budget: very large documents (e.g. scanned proceedings) are cut off
+# here instead of being held in memory in full. 0 disables a limit.
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "500"))
+MAX_PDF_CHARS = int(os.getenv("MAX_PDF_CHARS", "1000000"))
+
+
+def get_document_path(document_id: str, extension: str = "pdf") -> str:
+    if not DOCUMENT_ID_PATTERN.fullmatch(document_id or ""):
+        raise HTTPException(status_code=400, detail="Invalid document ID")
+    return os.path.join(DOCUMENT_DIR, f"{document_id}.{extension}")
+
+
+@contextmanager
+def map_pdf(pdf_file: BinaryIO):
+    """Memory-maps a PDF file so its bytes are paged in from disk on demand.
+
+    Streams without a file descriptor (e.g. BytesIO) are used as they are.
+    """
+    try:
+        fileno = pdf_file.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        yield pdf_file
+        return
+
+    if os.fstat(fileno).st_size == 0:
+        # mmap cannot map empty files; let PyPDF2 report it
+        yield pdf_file
+        return
+
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
+def iter_pdf_pages(pdf_file: BinaryIO, max_pages: int = MAX_PDF_PAGES) -> Iterator[str]:
+    """Yields the text of each page without keeping earlier pages parsed in memory."""
+    import PyPDF2
+
+    with map_pdf(pdf_file) as mapped:
+        pdf_reader = PyPDF2.PdfReader(mapped)
+        page_count = len(pdf_reader.pages)
+        if max_pages and page_count > max_pages:
+            logger.warning(f"PDF has {page_count} pages, extracting the first {max_pages}")
+            page_count = max_pages
+
+        for i in range(page_count):
+            logger.info(f"Processing page {i + 1}/{page_count}")
+            yield pdf_reader.pages[i].extract_text()
+            # Drop the parsed objects of this page; they are re-read from the file if needed again
+            pdf_reader.resolved_objects.clear()
+
+
+def write_pdf_text(pdf_file: BinaryIO, sink: TextIO, max_pages: int = MAX_PDF_PAGES,
+                   max_chars: int = MAX_PDF_CHARS) -> int:
+    """Writes the text of a PDF to ``sink`` page by page and returns the number of characters written."""
+    written = 0
+    with stage("extract"):
+        for page_text in iter_pdf_pages(pdf_file, max_pages):
+            text = page_text + "\n"
+            if max_chars and written + len(text) > max_chars:
+                sink.write(text[:max_chars - written])
+                written = max_chars
+                logger.warning(f"Stopped extraction at the {max_chars} character budget")
+                break
+            sink.write(text)
+            written += len(text)
+
+    logger.info(f"Text extraction completed ({written} characters)")
+    return written
+
+
+def extract_pdf_text(pdf_file: BinaryIO) -> str:
+    """Extracts the text of a PDF, within the page and character budget."""
+    sink = io.StringIO()
+    write_pdf_text(pdf_file, sink)
+    return sink.getvalue()
+
+
+def get_document_text(document_id: str) -> str:
+    """Returns the text of an uploaded document, extracting it on first use."""
+    import PyPDF2
+
+    pdf_path = get_document_path(document_id)
+    text_path = get_document_path(document_id, "txt")
+
+    if os.path.exists(text_path):
+        CACHE_HITS.labels("document_text").inc()
+        logger.info(f"Using cached text for document {document_id}")
+        with open(text_path, encoding="utf-8") as f:
+            return f.read()
+
+    if not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # Extract straight into the cache file, then publish it atomically so
+    # concurrent readers never see a partial entry
+    fd, temp_path = tempfile.mkstemp(dir=DOCUMENT_DIR, suffix=".txt.part")
+    try:
+        with open(pdf_path, "rb") as pdf_file, os.fdopen(fd, "w", encoding="utf-8") as sink:
+            write_pdf_text(pdf_file, sink)
+    except PyPDF2.errors.PdfReadError as e:
+        os.unlink(temp_path)
+        logger.error(f"PDF processing failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {e}")
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    os.replace(temp_path, text_path)
+
+    with open(text_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def get_artifact_path(document_id: str, name: str) -> str:
+    """Path of a derived artifact (summary, transcript, audio, video) stored next to a document."""
+    return get_document_path(document_id, name)
+
+
+def read_artifact(document_id: str, name: str) -> Optional[bytes]:
+    """Returns a cached artifact, or None if it has not been generated yet."""
+    path = get_artifact_path(document_id, name)
+    if not os.path.exists(path):
+        return None
+    # Label by artifact kind, not per-option variant (e.g. brainrot-<hash>.mp4)
+    CACHE_HITS.labels(name.split("-")[0]).inc()
+    logger.info(f"Using cached {name} for document {document_id}")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def has_artifact(document_id: str, name: str) -> bool:
+    return os.path.exists(get_artifact_path(document_id, name))
+
+
+def write_artifact(document_id: str, name: str, data: bytes):
+    """Stores an artifact atomically, so readers never see a partial file."""
+    fd, temp_path = tempfile.mkstemp(dir=DOCUMENT_DIR, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, get_artifact_path(document_id, name))
+
+
+def copy_artifact(document_id: str, name: str, source_path: str):
+    """Stores a copy of a generated file as an artifact."""
+    fd, temp_path = tempfile.mkstemp(dir=DOCUMENT_DIR, suffix=".part")
+    with os.fdopen(fd, "wb") as f, open(source_path, "rb") as source:
+        shutil.copyfileobj(source, f)
+    os.replace(temp_path, get_artifact_path(document_id, name))
+
+
+def get_url_index_path(url: str) -> str:
+    return os.path.join(URL_INDEX_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+
+def get_url_document(url: str) -> Optional[str]:
+    """Returns the ID of the document previously downloaded from this URL, if it is still stored."""
+    index_path = get_url_index_path(url)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, encoding="utf-8") as f:
+        document_id = f.read().strip()
+    if not os.path.exists(get_document_path(document_id)):
+        return None
+    return document_id
+
+
+def set_url_document(url: str, document_id: str):
+    fd, temp_path = tempfile.mkstemp(dir=URL_INDEX_DIR, suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(document_id)
+    os.replace(temp_path, get_url_index_path(url))
+
+
+class DocumentWriter:
+    """Writes a PDF into the document store as it arrives, hashing it on the way.
+
+    Only the current chunk is held in memory. Documents are stored under their
+    SHA-256, so the same paper is kept (and extracted) once however it arrives.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        # Start of the file, kept until it is long enough to check the PDF signature
+        self.header = b""
+        fd, self.temp_path = tempfile.mkstemp(dir=DOCUMENT_DIR, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+
+    def _check_header(self, chunk: bytes):
+        if len(self.header) >= len(PDF_SIGNATURE):
+            return
+        self.header += chunk[:len(PDF_SIGNATURE) - len(self.header)]
+        # Chunks can be arbitrarily small, so only reject once the signature can no longer match
+        if not PDF_SIGNATURE.startswith(self.header[:len(PDF_SIGNATURE)]):
+            raise HTTPException(status_code=400, detail="File is not a PDF")
+
+    def write(self, chunk: bytes):
+        self._check_header(chunk)
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"PDF exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit")
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+
+    def commit(self) -> str:
+        """Stores the document and returns its ID."""
+        self.file.close()
+        if self.size == 0:
+            os.unlink(self.temp_path)
+            raise HTTPException(status_code=400, detail="PDF is empty")
+        if self.header != PDF_SIGNATURE:
+            os.unlink(self.temp_path)
+            raise HTTPException(status_code=400, detail="File is not a PDF")
+
+        document_id = self.sha256.hexdigest()
+        pdf_path = get_document_path(document_id)
+        if os.path.exists(pdf_path):
+            CACHE_HITS.labels("document").inc()
+            logger.info(f"Document {document_id} already stored")
+            os.unlink(self.temp_path)
+        else:
+            os.replace(self.temp_path, pdf_path)
+            logger.info(f"Stored document {document_id} ({self.size} bytes)")
+        return document_id
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+
+class UploadSpooler:
+    """Streams one file field of a multipart body into the document store."""
+
+    def __init__(self, content_type: str, field_name: str = "file", max_bytes: int = MAX_UPLOAD_BYTES):
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+        self.field_name = field_name.encode()
+        self.filename: Optional[str] = None
+        self.found = False
+
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+
+        self.writer = DocumentWriter(max_bytes)
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    @property
+    def size(self) -> int:
+        return self.writer.size
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._in_file = not self.found and options.get(b"name") == self.field_name
+        if self._in_file:
+            self.filename = options.get(b"filename", b"").decode("utf-8", "replace") or None
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.writer.write(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self.found = True
+            self._in_file = False
+
+    def write(self, chunk: bytes):
+        self.parser.write(chunk)
+
+    def finish(self) -> str:
+        """Completes the upload and returns its document ID."""
+        self.parser.finalize()
+        if not self.found:
+            raise HTTPException(status_code=400, detail=f"No PDF found in the '{self.field_name.decode()}' field")
+        return self.writer.commit()
+
+    def discard(self):
+        self.writer.discard()
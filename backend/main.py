@@ -1,28 +1,39 @@
+import time
+
+# Measured from the first import so the cold-start cost of this module stays tracked
+_import_started = time.perf_counter()
+
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import requests
-import PyPDF2
-import io
 import traceback
-from google import genai
-# Remove: from google.generativeai import types
+# Heavy media and model libraries (moviepy, pydub, PyPDF2, google-genai, voiceover)
+# are imported on first use so workers that only serve /query or /health start fast.
 import logging
 import re
-from pydub import AudioSegment
 import tempfile
 import json
 import asyncio
-from voiceover import generate_voice_clips, join_audio_clips
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dialogue_stream import DialogueStreamParser
+from documents import (MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES, DocumentWriter, UploadSpooler, copy_artifact,
+                       get_artifact_path, get_document_text, get_url_document, has_artifact, read_artifact,
+                       set_url_document, write_artifact)
+from metrics import (CACHE_HITS, CONTENT_TYPE_LATEST, IMPORT_SECONDS, RATE_LIMITED, REQUEST_SECONDS, current_timings,
+                     latest_metrics, server_timing_header, snapshot_timings, stage, start_timings)
 import base64
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, AudioFileClip
-import numpy as np
-from typing import List
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List
-from google.genai.types import GenerateContentConfig, HttpOptions
-from prompts import BRAINROT_PROMPT, PODCAST_PROMPT
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Dict, Optional, List, Tuple
+from routing import call_with_fallback, stream_with_fallback
+from quota import BATCH, GENERATION, INTERACTIVE, gemini_quota, set_request_context
+from prompts import BRAINROT_PROMPT, PODCAST_PROMPT, PODCAST_SYSTEM_PROMPT, PODCAST_USER_PROMPT
 
 load_dotenv()
 
@@ -30,7 +41,41 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Created on first use by get_client()
+client = None
+
+
+def get_client():
+    """Returns the Gemini client, creating it on first use."""
+    global client
+    if client is None:
+        from google import genai
+        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return client
+
+
+def warm_up():
+    """Loads the media stack and creates the Gemini client ahead of the first request."""
+    start = time.perf_counter()
+    import PyPDF2  # noqa: F401
+    import moviepy.editor  # noqa: F401
+    import voiceover  # noqa: F401
+    from google.genai.types import GenerateContentConfig  # noqa: F401
+    from backgrounds import load_manifest
+    load_manifest()
+    get_client()
+    logger.info(f"Warm-up completed in {time.perf_counter() - start:.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Set WARM_UP=1 to pay the import cost at startup instead of on the first request
+    if os.getenv("WARM_UP", "").lower() in ("1", "true", "yes"):
+        await asyncio.to_thread(warm_up)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,7 +85,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# Priority of each endpoint's Gemini and ElevenLabs calls; anything else is GENERATION
+ROUTE_PRIORITIES = {
+    "/query": INTERACTIVE,
+    "/batch_query": BATCH,
+}
+
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Collects the per-stage timing breakdown of each request."""
+    # Provider quota is shared fairly between users: X-User-Id if the client sends one, else its address
+    user = request.headers.get("x-user-id") or (request.client.host if request.client else None)
+    set_request_context(priority=ROUTE_PRIORITIES.get(request.url.path, GENERATION), user=user)
+    timings = start_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so ids in the path don't create new series. call_next returns
+    # once the response starts, so streamed bodies aren't included
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(route.path if route else "unmatched").observe(time.perf_counter() - start)
+    if timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+        logger.info(f"{request.method} {request.url.path} timings: {current_timings()}")
+    return response
+
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Shared by every request so connections to arXiv are reused
+http_session = requests.Session()
+# Downloads and PDF extraction run here instead of blocking the event loop
+download_pool = ThreadPoolExecutor(max_workers=int(os.getenv("DOWNLOAD_WORKERS", "8")), thread_name_prefix="download")
+
+MAX_BATCH_SIZE = 100
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# Generated results cached next to each stored document (see documents.py)
+SUMMARY_ARTIFACT = "summary.txt"
+PODCAST_TRANSCRIPT_ARTIFACT = "podcast.json"
+PODCAST_AUDIO_ARTIFACT = "podcast.wav"
+BRAINROT_PHRASES_ARTIFACT = "brainrot.json"
+
+# Text options that change a rendered brainrot video, with the defaults for options a request leaves out
+BRAINROT_VIDEO_OPTIONS = {"text_color": "white", "font_size": 225, "duration_per_phrase": 3.0, "position": "center"}
+
+# Finished podcast streams are kept this long (seconds) for late audio/transcript requests
+PODCAST_STREAM_TTL = 3600
+# Read size when streaming a cached podcast.wav
+PODCAST_AUDIO_CHUNK_BYTES = 256 * 1024
 
 class Query(BaseModel):
     url: Optional[str] = None
@@ -48,12 +140,19 @@ class Query(BaseModel):
     is_arxiv: Optional[bool] = False
     context: Optional[str] = None
     file_content: Optional[str] = None
+    document_id: Optional[str] = None  # From /upload_pdf
+
+
+class BatchQuery(BaseModel):
+    urls: List[str]  # arXiv IDs, abs/pdf URLs or direct PDF URLs
+    concurrency: int = DEFAULT_BATCH_CONCURRENCY
 
 
 class Response(BaseModel):
     answer: str
     sources: Optional[List[str]] = None
     error: Optional[str] = None  # Add error field
+    timings: Optional[Dict[str, float]] = Field(default_factory=current_timings)
 
 
 class PodcastRequest(BaseModel):
@@ -62,93 +161,211 @@ class PodcastRequest(BaseModel):
     is_arxiv: Optional[bool] = False
     prompt: Optional[str] = None
     input_type: str = "url"
+    document_id: Optional[str] = None  # From /upload_pdf
 
 
 class PodcastResponse(BaseModel):
     transcript: str
     audio_file: str
     status: str
+    error: Optional[str] = None
+    timings: Optional[Dict[str, float]] = Field(default_factory=current_timings)
+
+
+class PodcastStreamResponse(BaseModel):
+    stream_id: str
+    audio_url: str
+    status: str
+
+
+class PodcastStreamStatus(BaseModel):
+    stream_id: str
+    transcript: str
+    lines: int
+    status: str
+    error: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
 
 
 class BrainRotRequest(BaseModel):
-    pdf_url: str
-    text_color: str = "white"
-    font_size: int = 200
-    duration_per_phrase: float = 3.0
-    position: str = "center"
+    pdf_url: Optional[str] = None
+    document_id: Optional[str] = None  # From /upload_pdf, used instead of pdf_url
+    text_color: str = BRAINROT_VIDEO_OPTIONS["text_color"]
+    font_size: int = BRAINROT_VIDEO_OPTIONS["font_size"]
+    duration_per_phrase: float = BRAINROT_VIDEO_OPTIONS["duration_per_phrase"]
+    position: str = BRAINROT_VIDEO_OPTIONS["position"]
+
+
+class UploadResponse(BaseModel):
+    document_id: str
+    filename: Optional[str] = None
+    size: int
+    status: str
 
 
 class BrainRotResponse(BaseModel):
     video_file: str
     status: str
     error: Optional[str] = None
+    timings: Optional[Dict[str, float]] = Field(default_factory=current_timings)
 
 
-def download_pdf(url: str) -> str:
-    """Download PDF from URL and extract text."""
-    try:
-        logger.info(f"Downloading PDF from: {url}")  # Use logger
-        response = requests.get(url)
-        response.raise_for_status()
-
-        logger.info("PDF downloaded successfully, extracting text...")
-        pdf_file = io.BytesIO(response.content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        
-        # Extract text from all pages
-
-        # Extract text from all pages
-        text = ""
-        for i, page in enumerate(pdf_reader.pages):
-            logger.info(f"Processing page {i + 1}/{len(pdf_reader.pages)}")
-            text += page.extract_text() + "\n"
+def fetch_document(url: str) -> str:
+    """Downloads a PDF into the document store and returns its document ID.
 
-        logger.info("Text extraction completed")
-        return text
+    URLs that were downloaded before are served from the store without a request.
+    """
+    url = normalize_paper_url(url)
+    document_id = get_url_document(url)
+    if document_id:
+        CACHE_HITS.labels("download").inc()
+        logger.info(f"Using stored document {document_id} for {url}")
+        return document_id
 
+    logger.info(f"Downloading PDF from: {url}")  # Use logger
+    # Stream to disk rather than holding the whole response in memory
+    writer = DocumentWriter()
+    try:
+        with stage("download"):
+            with http_session.get(url, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                    writer.write(chunk)
+        document_id = writer.commit()
     except requests.exceptions.RequestException as e:  # Specific exception
+        writer.discard()
         logger.error(f"Download failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to download PDF: {e}")
-    except PyPDF2.errors.PdfReadError as e:  # Specific exception
-        logger.error(f"PDF processing failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error in download_pdf: {e}")
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")  # Generic message
+    except Exception:
+        writer.discard()
+        raise
+
+    set_url_document(url, document_id)
+    logger.info("PDF downloaded successfully")
+    return document_id
+
+
+def get_brainrot_options(request_data: dict) -> dict:
+    """Text options a brainrot video is rendered with, filling in the defaults."""
+    return {key: request_data.get(key, default) for key, default in BRAINROT_VIDEO_OPTIONS.items()}
+
+
+def get_brainrot_video_artifact(request_data: dict) -> str:
+    """Artifact name of a rendered brainrot video; each combination of text options is cached separately."""
+    options = get_brainrot_options(request_data)
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"brainrot-{digest}.mp4"
 
 
 def process_text(text: str) -> str:
     """Process and clean the input text."""
-    return text.strip()
+    with stage("preprocess"):
+        return text.strip()
 
 
-def call_gemini(prompt: str, system_message: str) -> str:
+async def run_in_download_pool(func, *args):
+    """Runs blocking download/extraction work on the shared pool, keeping the request's timing context."""
+    context = copy_context()
+    return await asyncio.get_running_loop().run_in_executor(download_pool, context.run, func, *args)
+
+
+def normalize_paper_url(item: str) -> str:
+    """Turns an arXiv ID, abs or pdf URL into its canonical PDF URL; other URLs are returned unchanged."""
+    item = item.strip()
+    match = re.fullmatch(r"(?:arxiv:)?(\d{4}\.\d{4,5}(?:v\d+)?)", item, re.IGNORECASE)
+    if match:
+        return f"https://arxiv.org/pdf/{match.group(1)}"
+    item = re.sub(r"^(https?://(?:www\.)?arxiv\.org)/abs/", r"\1/pdf/", item)
+    # arxiv.org/pdf/<id> and arxiv.org/pdf/<id>.pdf are the same paper
+    return re.sub(r"^(https?://(?:www\.)?arxiv\.org/pdf/.+)\.pdf$", r"\1", item)
+
+
+def count_gemini_error(error: Exception):
+    if getattr(error, "code", None) == 429:
+        RATE_LIMITED.labels("gemini").inc()
+
+
+async def generate_content(task: str, contents: str, config=None):
+    """Runs a Gemini call on the models routed for the task, each attempt within the shared Gemini quota."""
+    def generate(model: str):
+        return get_client().aio.models.generate_content(model=model, contents=contents, config=config)
+
+    return await call_with_fallback(task, len(contents), generate, slot=gemini_quota.slot, on_error=count_gemini_error)
+
+
+async def call_gemini(prompt: str, system_message: str, task: str = "brainrot_phrases") -> str:
     """Calls the Gemini model."""
+    from google.genai.types import GenerateContentConfig
+
     logger.info("Calling Gemini model...")
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-pro-exp-03-25",
-            contents=prompt,
-            config=GenerateContentConfig(system_instruction=system_message),
-        )
+        response = await generate_content(task, prompt, GenerateContentConfig(system_instruction=system_message))
         logger.info("Gemini model returned output")
-        print(response.text)
+        logger.debug(f"Gemini output: {response.text}")
         return response.text
     except Exception as e:
         logger.error(f"Gemini API call failed: {e}")
         raise HTTPException(status_code=500, detail=f"Gemini API call failed: {e}")
 
 
+async def summarize(text: str) -> str:
+    """Asks Gemini about the processed text."""
+    logger.info("Sending to Gemini model...")
+    try:
+        response = await generate_content("summary", text)
+        logger.info("Received response from Gemini")
+        return response.text
+    except Exception as e:
+        logger.error(f"Gemini API call failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Gemini API call failed: {e}")
+
+
+async def summarize_document(document_id: str) -> str:
+    """Summarizes a stored document, reusing its cached summary if there is one."""
+    cached = read_artifact(document_id, SUMMARY_ARTIFACT)
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    processed_text = process_text(await run_in_download_pool(get_document_text, document_id))
+    logger.info(f"Extracted text length: {len(processed_text)} characters")
+    answer = await summarize(processed_text)
+    write_artifact(document_id, SUMMARY_ARTIFACT, answer.encode("utf-8"))
+    return answer
+
+
+async def stream_gemini(prompt: str, system_message: str, task: str = "podcast_script") -> AsyncIterator[str]:
+    """Streams the Gemini model output as text chunks, holding a Gemini quota slot until it ends.
 
-def podcast_generator(prompt: str, system_message: str, input_content: str, input_type: str) -> dict:
-    """Generates a podcast transcript."""
+    Falls back to the next routed model if one fails or times out before its
+    first chunk; once output has been streamed, errors (including a stalled
+    stream) are raised.
+    """
+    from google.genai.types import GenerateContentConfig
 
+    config = GenerateContentConfig(system_instruction=system_message)
+
+    def open_stream(model: str):
+        return get_client().aio.models.generate_content_stream(model=model, contents=prompt, config=config)
+
+    logger.info("Streaming from Gemini model...")
     try:
-        logger.info("Generating podcast dialogue...")
+        async for chunk in stream_with_fallback(task, len(prompt), open_stream, slot=gemini_quota.slot,
+                                                on_error=count_gemini_error):
+            if chunk.text:
+                yield chunk.text
+        logger.info("Gemini model finished streaming")
+    except Exception as e:
+        logger.error(f"Gemini API call failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Gemini API call failed: {e}")
+
+
+async def podcast_generator(prompt: str, system_message: str, input_content: str, input_type: str,
+                            parser: DialogueStreamParser) -> AsyncIterator[dict]:
+    """Streams the podcast transcript, yielding each dialogue line as soon as it is complete."""
+    logger.info("Generating podcast dialogue...")
 
-        if input_type == "url":
-            full_prompt = f"""<input_text>
+    if input_type == "url":
+        full_prompt = f"""<input_text>
 {input_content}
 </input_text>
 
@@ -157,132 +374,167 @@ def podcast_generator(prompt: str, system_message: str, input_content: str, inpu
 </user_instruction>
 
 {PODCAST_PROMPT}"""
+    else:
+        full_prompt = prompt
 
-            dialogue = call_gemini(prompt=full_prompt, system_message=system_message)
-        else:
-            dialogue = call_gemini(prompt=prompt, system_message=system_message)
+    async for chunk in stream_gemini(prompt=full_prompt, system_message=system_message):
+        for line in parser.feed(chunk):
+            yield line
 
-        if not dialogue:
-            logger.warning("No dialogue generated")
-            raise ValueError("No dialogue generated")
-        return {
-            "transcript": dialogue
-        }
+    if not parser.text:
+        logger.warning("No dialogue generated")
+        raise HTTPException(status_code=500, detail="Error generating podcast: No dialogue generated")
 
-    except Exception as e:
-        logger.error(f"Podcast generation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Error generating podcast: {e}")
+
+async def cached_podcast_generator(transcript: bytes, parser: DialogueStreamParser) -> AsyncIterator[dict]:
+    """Replays a cached podcast transcript as if it had just been generated."""
+    for line in parser.feed(f"<dialogue>\n{transcript.decode('utf-8')}\n</dialogue>"):
+        yield line
+
+
+def get_podcast_document(request: PodcastRequest) -> Optional[str]:
+    """Returns the stored document a podcast is generated from, downloading arXiv papers on first use."""
+    if request.document_id:
+        return request.document_id
+    if request.input_type == "url" and request.url and request.is_arxiv:
+        return fetch_document(request.url)
+    return None
+
+
+def get_podcast_cache_id(request: PodcastRequest, document_id: Optional[str]) -> Optional[str]:
+    """Podcasts are cached per document, and only for the default prompt."""
+    if document_id and request.input_type == "url" and not request.prompt:
+        return document_id
+    return None
+
+
+def get_podcast_input(request: PodcastRequest, document_id: Optional[str]) -> str:
+    """Gets the podcast input content based on the request type."""
+    if document_id:
+        return get_document_text(document_id)
+    if request.input_type == "url" and request.url:
+        with stage("download"):
+            response = http_session.get(request.url)
+            response.raise_for_status()
+        return response.text
+    if request.text:
+        return request.text
+    raise HTTPException(status_code=400, detail="No input provided")
 
 
 @app.post("/generate_podcast", response_model=PodcastResponse)
 async def generate_podcast_endpoint(request: PodcastRequest):
     """Generates a podcast based on the provided request."""
+    from voiceover import VoiceClipScheduler, join_audio_clips
+
     try:
         logger.info("Received request to generate podcast")
         
-        # Get input content based on type
-        if request.input_type == "url" and request.url:
-            if request.is_arxiv:
-                pdf_url = request.url.replace('/abs/', '/pdf/') + '.pdf'
-                input_content = download_pdf(pdf_url)
-            else:
-                response = requests.get(request.url)
-                response.raise_for_status()
-                input_content = response.text
-        elif request.text:
-            input_content = request.text
+        document_id = await run_in_download_pool(get_podcast_document, request)
+        cache_id = get_podcast_cache_id(request, document_id)
+        cached_transcript = read_artifact(cache_id, PODCAST_TRANSCRIPT_ARTIFACT) if cache_id else None
+        if cached_transcript is not None:
+            cached_audio = read_artifact(cache_id, PODCAST_AUDIO_ARTIFACT)
+            if cached_audio is not None:
+                return PodcastResponse(
+                    transcript=str(json.loads(cached_transcript)),  # Convert to string
+                    audio_file=base64.b64encode(cached_audio).decode('utf-8'),
+                    status="success"
+                )
+
+        # Stream the transcript and start voice synthesis for each line as soon as it closes
+        parser = DialogueStreamParser()
+        scheduler = VoiceClipScheduler()
+        if cached_transcript is not None:
+            lines = cached_podcast_generator(cached_transcript, parser)
         else:
-            raise HTTPException(status_code=400, detail="No input provided")
+            lines = podcast_generator(prompt=request.prompt or PODCAST_USER_PROMPT,
+                                      system_message=PODCAST_SYSTEM_PROMPT,
+                                      input_content=await run_in_download_pool(get_podcast_input, request, document_id),
+                                      input_type=request.input_type, parser=parser)
+        try:
+            async for line in lines:
+                scheduler.submit(line)
+        except json.JSONDecodeError as e:
+            scheduler.cancel()
+            logger.error(f"Failed to parse JSON transcript: {e}")
+            return PodcastResponse(
+                transcript=str(parser.text),  # Use original transcript as string
+                audio_file="",
+                status="error",
+                error="Failed to parse podcast transcript"
+            )
+        except Exception:
+            scheduler.cancel()
+            raise
 
-        # Generate podcast transcript
-        prompt = request.prompt or """Create a podcast dialogue based on the following content. 
-        Format the response as a conversation between two speakers, followed by their dialogue.
-        Make it sound like a real podcast with natural conversation flow.
-        
-        Content:
-        {input_content}"""
+        transcript = parser.text
+        logger.info("Generated podcast transcript")
+        logger.debug(f"Transcript: {transcript}")
 
-        system_instructions = """You are a podcast script generator. Create engaging and natural-sounding dialogue 
-        between two speakers discussing the given content. Make it sound like a real podcast conversation."""
+        if not parser.lines:
+            logger.error("Could not find <dialogue> section in the text")
+            return PodcastResponse(
+                transcript=str(transcript),  # Use original transcript as string
+                audio_file="",
+                status="error",
+                error="Could not find dialogue section in transcript"
+            )
 
-        # Generate the podcast transcript
-        response = podcast_generator(prompt=prompt, system_message=system_instructions, input_content=input_content, input_type=request.input_type)
-        transcript = response["transcript"]
-        cleaned_text = transcript.replace("*", "")
-        logger.info("Generated podcast transcript")
-        print(transcript, "transcript")
-        
-        match = re.search(r"<dialogue>\s*(\[.*?\])\s*</dialogue>", cleaned_text, re.DOTALL)
+        dialogue_list = parser.lines
+        logger.info(f"Extracted {len(dialogue_list)} dialogue lines")
 
-        if match:
-            dialogue_json_str = match.group(1)
-            try:
-                dialogue_list = json.loads(dialogue_json_str)
-                print("✅ Successfully extracted dialogue list:")
-                print(dialogue_list)
-                
-                # Generate voice clips
-                await generate_voice_clips(dialogue_list)
-                logger.info("Generated voice clips")
-                
-                # Join audio clips
-                final_audio_path = join_audio_clips(dialogue_list)
-                if not final_audio_path:
-                    logger.error("Failed to generate final audio path")
-                    return PodcastResponse(
-                        transcript=str(dialogue_list),  # Convert to string
-                        audio_file="",
-                        status="error",
-                        error="Failed to generate audio file"
-                    )
-                logger.info(f"Joined audio clips into: {final_audio_path}")
-                
-                try:
-                    if not os.path.exists(final_audio_path):
-                        logger.error(f"Audio file not found at path: {final_audio_path}")
-                        return PodcastResponse(
-                            transcript=str(dialogue_list),  # Convert to string
-                            audio_file="",
-                            status="error",
-                            error="Audio file not found"
-                        )
-                        
-                    with open(final_audio_path, "rb") as f:
-                        audio_data = f.read()
-                        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                    logger.info("Successfully converted audio to base64")
-                except Exception as e:
-                    logger.error(f"Failed to read and convert audio file: {e}")
-                    return PodcastResponse(
-                        transcript=str(dialogue_list),  # Convert to string
-                        audio_file="",
-                        status="error",
-                        error="Failed to process audio file"
-                    )
+        # Wait for the remaining voice clips
+        await scheduler.wait()
+        logger.info("Generated voice clips")
+
+        # Join audio clips into a file of its own so concurrent podcasts don't overwrite each other
+        with stage("audio_join"):
+            final_audio_path = join_audio_clips(dialogue_list, output_file=f"podcast-{uuid.uuid4().hex}.wav")
+        if not final_audio_path:
+            logger.error("Failed to generate final audio path")
+            return PodcastResponse(
+                transcript=str(dialogue_list),  # Convert to string
+                audio_file="",
+                status="error",
+                error="Failed to generate audio file"
+            )
+        logger.info(f"Joined audio clips into: {final_audio_path}")
 
+        try:
+            if not os.path.exists(final_audio_path):
+                logger.error(f"Audio file not found at path: {final_audio_path}")
                 return PodcastResponse(
                     transcript=str(dialogue_list),  # Convert to string
-                    audio_file=audio_base64,
-                    status="success"
-                )
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON transcript: {e}")
-                return PodcastResponse(
-                    transcript=str(transcript),  # Use original transcript as string
                     audio_file="",
                     status="error",
-                    error="Failed to parse podcast transcript"
+                    error="Audio file not found"
                 )
-        else:
-            logger.error("Could not find <dialogue> section in the text")
+
+            with open(final_audio_path, "rb") as f:
+                audio_data = f.read()
+                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+            logger.info("Successfully converted audio to base64")
+
+            if cache_id:
+                write_artifact(cache_id, PODCAST_TRANSCRIPT_ARTIFACT, json.dumps(dialogue_list).encode("utf-8"))
+                copy_artifact(cache_id, PODCAST_AUDIO_ARTIFACT, final_audio_path)
+            os.unlink(final_audio_path)
+        except Exception as e:
+            logger.error(f"Failed to read and convert audio file: {e}")
             return PodcastResponse(
-                transcript=str(transcript),  # Use original transcript as string
+                transcript=str(dialogue_list),  # Convert to string
                 audio_file="",
                 status="error",
-                error="Could not find dialogue section in transcript"
+                error="Failed to process audio file"
             )
 
+        return PodcastResponse(
+            transcript=str(dialogue_list),  # Convert to string
+            audio_file=audio_base64,
+            status="success"
+        )
+
     except Exception as e:
         logger.exception("Unexpected error during podcast generation")
         return PodcastResponse(
@@ -293,33 +545,293 @@ async def generate_podcast_endpoint(request: PodcastRequest):
         )
 
 
+class PodcastStream:
+    """A podcast whose audio is streamed to the client while it is being generated."""
+
+    def __init__(self, stream_id: str):
+        self.stream_id = stream_id
+        self.created_at = time.time()
+        self.status = "processing"
+        self.error: Optional[str] = None
+        self.parser = DialogueStreamParser()
+        self.clips_ready: List[asyncio.Future] = []
+        self.updated = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.timings: Dict[str, float] = {}
+        # Set when the podcast was generated before; its stored audio is served instead of the clips
+        self.cached_audio_path: Optional[str] = None
+
+    def add_line(self, clips_ready: asyncio.Future):
+        self.clips_ready.append(clips_ready)
+        self._notify()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    async def lines(self) -> AsyncIterator[Tuple[dict, asyncio.Future]]:
+        """Yields dialogue lines in order, waiting for new ones until generation finishes."""
+        index = 0
+        while True:
+            if index < len(self.clips_ready):
+                yield self.parser.lines[index], self.clips_ready[index]
+                index += 1
+            elif self.status != "processing":
+                return
+            else:
+                await self.updated.wait()
+
+    async def audio(self) -> AsyncIterator[bytes]:
+        """Streams the podcast as WAV, from the cache or line by line as it is synthesized."""
+        from voiceover import stream_dialogue_audio
+
+        # The job checks the cache before it hands out any lines
+        while self.cached_audio_path is None and not self.clips_ready and self.status == "processing":
+            await self.updated.wait()
+        if self.cached_audio_path is None:
+            async for data in stream_dialogue_audio(self.lines()):
+                yield data
+            return
+
+        with open(self.cached_audio_path, "rb") as f:
+            while True:
+                data = await asyncio.to_thread(f.read, PODCAST_AUDIO_CHUNK_BYTES)
+                if not data:
+                    return
+                yield data
+
+
+podcast_streams: Dict[str, PodcastStream] = {}
+
+
+def prune_podcast_streams():
+    """Drops finished streams older than PODCAST_STREAM_TTL."""
+    now = time.time()
+    for stream_id, stream in list(podcast_streams.items()):
+        if stream.status != "processing" and now - stream.created_at > PODCAST_STREAM_TTL:
+            del podcast_streams[stream_id]
+
+
+def store_podcast_audio(cache_id: str, dialogue: List[dict]):
+    """Joins the clips of a streamed podcast into the cached podcast.wav served to later listeners."""
+    from voiceover import join_audio_clips
+
+    with stage("audio_join"):
+        audio_path = join_audio_clips(dialogue, output_file=f"podcast-{uuid.uuid4().hex}.wav")
+    try:
+        copy_artifact(cache_id, PODCAST_AUDIO_ARTIFACT, audio_path)
+    finally:
+        os.unlink(audio_path)
+
+
+async def run_podcast_stream(stream: PodcastStream, request: PodcastRequest):
+    """Generates the transcript and voice clips for a streamed podcast."""
+    # The background job outlives the request that started it, so it keeps its own breakdown
+    stream.timings = start_timings()
+    from voiceover import VoiceClipScheduler
+
+    scheduler = VoiceClipScheduler()
+    try:
+        document_id = await run_in_download_pool(get_podcast_document, request)
+        cache_id = get_podcast_cache_id(request, document_id)
+        cached_transcript = read_artifact(cache_id, PODCAST_TRANSCRIPT_ARTIFACT) if cache_id else None
+        if cached_transcript is not None and has_artifact(cache_id, PODCAST_AUDIO_ARTIFACT):
+            # Generated (or pre-warmed) before: fill in the transcript and serve the stored audio
+            async for _ in cached_podcast_generator(cached_transcript, stream.parser):
+                pass
+            CACHE_HITS.labels(PODCAST_AUDIO_ARTIFACT).inc()
+            logger.info(f"Using cached {PODCAST_AUDIO_ARTIFACT} for document {cache_id}")
+            stream.cached_audio_path = get_artifact_path(cache_id, PODCAST_AUDIO_ARTIFACT)
+            stream.finish("success")
+            return
+
+        if cached_transcript is not None:
+            lines = cached_podcast_generator(cached_transcript, stream.parser)
+        else:
+            input_content = await run_in_download_pool(get_podcast_input, request, document_id)
+            lines = podcast_generator(prompt=request.prompt or PODCAST_USER_PROMPT,
+                                      system_message=PODCAST_SYSTEM_PROMPT,
+                                      input_content=input_content, input_type=request.input_type,
+                                      parser=stream.parser)
+        async for line in lines:
+            stream.add_line(scheduler.submit(line))
+
+        if not stream.parser.lines:
+            logger.error("Could not find <dialogue> section in the text")
+            stream.finish("error", "Could not find dialogue section in transcript")
+            return
+
+        await scheduler.wait()
+        logger.info(f"Generated voice clips for podcast stream {stream.stream_id}")
+        if cache_id and cached_transcript is None:
+            write_artifact(cache_id, PODCAST_TRANSCRIPT_ARTIFACT, json.dumps(stream.parser.lines).encode("utf-8"))
+        stream.finish("success")
+
+        if cache_id:
+            # Listeners already have their audio; store it for the next request for this paper
+            try:
+                await asyncio.to_thread(store_podcast_audio, cache_id, stream.parser.lines)
+            except Exception as e:
+                logger.error(f"Failed to cache audio for podcast stream {stream.stream_id}: {e}")
+
+    # Every submitted line has been handed to the stream, so its clips are left to
+    # finish for listeners rather than cancelled
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON transcript: {e}")
+        stream.finish("error", "Failed to parse podcast transcript")
+    except HTTPException as e:
+        logger.error(f"Podcast stream {stream.stream_id} failed: {e.detail}")
+        stream.finish("error", str(e.detail))
+    except Exception as e:
+        logger.exception(f"Unexpected error in podcast stream {stream.stream_id}")
+        stream.finish("error", str(e))
+
+
+@app.post("/generate_podcast/stream", response_model=PodcastStreamResponse)
+async def start_podcast_stream(request: PodcastRequest):
+    """Starts generating a podcast whose audio can be played while it is still being produced."""
+    prune_podcast_streams()
+
+    stream = PodcastStream(uuid.uuid4().hex)
+    podcast_streams[stream.stream_id] = stream
+    stream.task = asyncio.create_task(run_podcast_stream(stream, request))
+    logger.info(f"Started podcast stream {stream.stream_id}")
+
+    return PodcastStreamResponse(
+        stream_id=stream.stream_id,
+        audio_url=f"/podcast_streams/{stream.stream_id}/audio",
+        status=stream.status
+    )
+
+
+@app.get("/podcast_streams/{stream_id}", response_model=PodcastStreamStatus)
+async def get_podcast_stream(stream_id: str):
+    """Returns the transcript generated so far and the status of a podcast stream."""
+    stream = podcast_streams.get(stream_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Podcast stream not found")
+
+    return PodcastStreamStatus(
+        stream_id=stream_id,
+        transcript=str(stream.parser.lines),  # Convert to string
+        lines=len(stream.parser.lines),
+        status=stream.status,
+        error=stream.error,
+        timings=snapshot_timings(stream.timings)
+    )
+
+
+@app.get("/podcast_streams/{stream_id}/audio")
+async def get_podcast_stream_audio(stream_id: str):
+    """Streams the podcast as WAV audio, in dialogue order, as each line is synthesized."""
+    stream = podcast_streams.get(stream_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Podcast stream not found")
+
+    return StreamingResponse(stream.audio(), media_type="audio/wav")
+
+
+@app.post("/upload_pdf", response_model=UploadResponse)
+async def upload_pdf(request: Request):
+    """Streams an uploaded PDF (multipart field "file") to disk and returns a reusable document ID."""
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"PDF exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+
+    spooler = UploadSpooler(request.headers.get("content-type", ""))
+    try:
+        with stage("upload"):
+            async for chunk in request.stream():
+                spooler.write(chunk)
+            document_id = spooler.finish()
+    except Exception:
+        spooler.discard()
+        raise
+
+    return UploadResponse(
+        document_id=document_id,
+        filename=spooler.filename,
+        size=spooler.size,
+        status="success"
+    )
+
+
 @app.post("/query", response_model=Response)
 async def process_query(query: Query):
     """Processes a user query."""
     try:
         logger.info(f"Received query: {query}")
-        if query.url and query.is_arxiv:
+        if query.document_id:
+            logger.info(f"Processing uploaded document {query.document_id}")
+            return Response(answer=await summarize_document(query.document_id))
+        elif query.url and query.is_arxiv:
             logger.info("Processing arXiv URL")
-            pdf_text = download_pdf(query.url)
-            processed_text = process_text(pdf_text)
-            logger.info(f"Extracted text length: {len(processed_text)} characters")
+            document_id = await run_in_download_pool(fetch_document, query.url)
+            return Response(answer=await summarize_document(document_id))
         else:
             logger.info("Processing regular text")
             processed_text = process_text(query.text or "")
 
-        logger.info("Sending to Gemini model...")
-        response = client.models.generate_content(
-            model="gemini-2.5-pro-exp-03-25",
-            contents=processed_text
-        )
-
-        logger.info("Received response from Gemini")
-        return Response(answer=response.text)
+        return Response(answer=await summarize(processed_text))
 
     except Exception as e:
         logger.exception(f"Error processing query: {e}")  # Log the exception and traceback
         return Response(answer="", error=str(e))  # Return error information
 
+async def summarize_batch_item(index: int, item: str, semaphore: asyncio.Semaphore) -> dict:
+    """Summarizes one paper of a batch; failures are reported in the result instead of raised."""
+    async with semaphore:
+        # Each item runs in its own task, so this breakdown covers only this paper
+        start_timings()
+        try:
+            document_id = await run_in_download_pool(fetch_document, item)
+            answer = await summarize_document(document_id)
+            return {"index": index, "url": item, "status": "success", "answer": answer,
+                    "timings": current_timings()}
+        except HTTPException as e:
+            error = str(e.detail)
+        except Exception as e:
+            error = str(e)
+        logger.error(f"Batch item {index} ({item}) failed: {error}")
+        return {"index": index, "url": item, "status": "error", "error": error, "timings": current_timings()}
+
+
+async def stream_batch_results(urls: List[str], concurrency: int) -> AsyncIterator[str]:
+    """Yields one NDJSON line per paper, in completion order."""
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(summarize_batch_item(i, url, semaphore)) for i, url in enumerate(urls)]
+    try:
+        for completed in asyncio.as_completed(tasks):
+            yield json.dumps(await completed) + "\n"
+    finally:
+        # The client went away before the batch finished
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/batch_query")
+async def batch_query(batch: BatchQuery):
+    """Summarizes a reading list, streaming each result as NDJSON as soon as it is ready."""
+    if not batch.urls:
+        raise HTTPException(status_code=400, detail="No URLs provided")
+    if len(batch.urls) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} URLs per batch")
+
+    concurrency = max(1, min(batch.concurrency, len(batch.urls)))
+    logger.info(f"Received batch of {len(batch.urls)} papers (concurrency {concurrency})")
+    return StreamingResponse(stream_batch_results(batch.urls, concurrency), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint."""
+    return PlainTextResponse(latest_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -330,6 +842,10 @@ async def generate_brainrot(
     request: str = Form(...)
 ):
     """Generates a brain rot style video with text from PDF URL."""
+    from moviepy.editor import TextClip, CompositeVideoClip, AudioFileClip
+    from backgrounds import load_background, select_background
+    from voiceover import generate_voice_clips, join_audio_clips
+
     try:
         logger.info("Starting brain rot video generation")
         
@@ -348,41 +864,59 @@ async def generate_brainrot(
         # Process PDF and generate script
         logger.info("Processing PDF and generating script")
         try:
-            # Download and extract text from PDF
-            pdf_text = download_pdf(request_data['pdf_url'])
-            logger.info("Successfully extracted text from PDF")
+            # Download the PDF, or reuse an uploaded one
+            if request_data.get('document_id'):
+                document_id = request_data['document_id']
+            else:
+                document_id = await run_in_download_pool(fetch_document, request_data['pdf_url'])
 
-            # Generate script using Gemini
-            prompt = BRAINROT_PROMPT.format(content=pdf_text)
+            video_artifact = get_brainrot_video_artifact(request_data)
+            cached_video = read_artifact(document_id, video_artifact)
+            if cached_video is not None:
+                return BrainRotResponse(
+                    video_file=base64.b64encode(cached_video).decode('utf-8'),
+                    status="success"
+                )
 
-            script_response = call_gemini(
-                prompt=prompt,
-                system_message="You are a content creator specializing in viral, attention-grabbing content. Convert the given text into short, engaging phrases suitable for a brain rot style video."
-            )
+            cached_phrases = read_artifact(document_id, BRAINROT_PHRASES_ARTIFACT)
+            if cached_phrases is not None:
+                phrases = json.loads(cached_phrases)
+            else:
+                pdf_text = await run_in_download_pool(get_document_text, document_id)
+                logger.info("Successfully extracted text from PDF")
 
-            # Parse the response into phrases
-            try:
-                # Clean up the response by removing markdown code block markers
-                cleaned_response = script_response.strip()
-                if cleaned_response.startswith('```json'):
-                    cleaned_response = cleaned_response[7:]  # Remove ```json
-                if cleaned_response.endswith('```'):
-                    cleaned_response = cleaned_response[:-3]  # Remove ```
-                cleaned_response = cleaned_response.strip()
-                
-                phrases = json.loads(cleaned_response)
-                if not isinstance(phrases, list):
-                    raise ValueError("Response is not a list")
-                logger.info(f"Generated {len(phrases)} phrases from PDF")
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse Gemini response: {str(e)}")
-                logger.error(f"Response content: {script_response}")
-                return BrainRotResponse(
-                    video_file="",
-                    status="error",
-                    error="Failed to generate script from PDF"
+                # Generate script using Gemini
+                prompt = BRAINROT_PROMPT.format(content=pdf_text)
+
+                script_response = await call_gemini(
+                    prompt=prompt,
+                    system_message="You are a content creator specializing in viral, attention-grabbing content. Convert the given text into short, engaging phrases suitable for a brain rot style video."
                 )
 
+                # Parse the response into phrases
+                try:
+                    # Clean up the response by removing markdown code block markers
+                    cleaned_response = script_response.strip()
+                    if cleaned_response.startswith('```json'):
+                        cleaned_response = cleaned_response[7:]  # Remove ```json
+                    if cleaned_response.endswith('```'):
+                        cleaned_response = cleaned_response[:-3]  # Remove ```
+                    cleaned_response = cleaned_response.strip()
+
+                    phrases = json.loads(cleaned_response)
+                    if not isinstance(phrases, list):
+                        raise ValueError("Response is not a list")
+                    logger.info(f"Generated {len(phrases)} phrases from PDF")
+                except json.JSONDecodeError as e:
+                    logger.error(f"Failed to parse Gemini response: {str(e)}")
+                    logger.error(f"Response content: {script_response}")
+                    return BrainRotResponse(
+                        video_file="",
+                        status="error",
+                        error="Failed to generate script from PDF"
+                    )
+                write_artifact(document_id, BRAINROT_PHRASES_ARTIFACT, json.dumps(phrases).encode("utf-8"))
+
         except Exception as e:
             logger.error(f"Error processing PDF: {str(e)}")
             return BrainRotResponse(
@@ -409,7 +943,8 @@ async def generate_brainrot(
             logger.info("Generated voice clip")
             
             # Get the audio path
-            final_audio_path = join_audio_clips(dialogue)
+            with stage("audio_join"):
+                final_audio_path = join_audio_clips(dialogue, output_file=f"brainrot-{uuid.uuid4().hex}.wav")
             if not final_audio_path:
                 logger.error("Failed to generate final audio path")
                 return BrainRotResponse(
@@ -430,49 +965,55 @@ async def generate_brainrot(
         # Process video and add text overlays
         logger.info("Processing video with generated phrases and audio")
         try:
-            # Use default video from static folder
-            default_video_path = os.path.join("static", "input.mov")
-            if not os.path.exists(default_video_path):
-                logger.error(f"Default video not found at path: {default_video_path}")
-                return BrainRotResponse(
-                    video_file="",
-                    status="error",
-                    error="Default background video not found"
-                )
+            with stage("video_render"):
+                # Load the audio
+                audio_clip = AudioFileClip(final_audio_path)
+
+                options = get_brainrot_options(request_data)
+
+                # The video runs for the narration, or longer if the phrases need it
+                duration = max(audio_clip.duration, len(phrases) * options['duration_per_phrase'])
+
+                # Pick a pre-transcoded background (see backgrounds.py) and decode only the segment we need
+                background = select_background(duration, seed=document_id)
+                if background is None:
+                    logger.error("No background video found")
+                    audio_clip.close()
+                    return BrainRotResponse(
+                        video_file="",
+                        status="error",
+                        error="Default background video not found"
+                    )
+                video_clip = load_background(background, duration)
+
+                # Create text clips for each phrase
+                text_clips = []
+                for i, phrase in enumerate(phrases):
+                    start_time = i * options['duration_per_phrase']
+
+                    txt_clip = TextClip(
+                        phrase,
+                        fontsize=options['font_size'],
+                        color=options['text_color'],
+                        bg_color='transparent',
+                        font='Arial-Bold',
+                        method='caption'
+                    )
+
+                    txt_clip = txt_clip.set_position(options['position'])
+                    txt_clip = txt_clip.set_duration(options['duration_per_phrase'])
+                    txt_clip = txt_clip.set_start(start_time)
+
+                    text_clips.append(txt_clip)
+
+                # Create final video with audio
+                final_video = CompositeVideoClip([video_clip] + text_clips)
+                final_video = final_video.set_audio(audio_clip)
 
-            # Load the video
-            video_clip = VideoFileClip(default_video_path)
-            
-            # Load the audio
-            audio_clip = AudioFileClip(final_audio_path)
-            
-            # Create text clips for each phrase
-            text_clips = []
-            for i, phrase in enumerate(phrases):
-                start_time = i * request_data.get('duration_per_phrase', 2.0)
-                
-                txt_clip = TextClip(
-                    phrase,
-                    fontsize=request_data.get('font_size', 200),
-                    color=request_data.get('text_color', 'white'),
-                    bg_color='transparent',
-                    font='Arial-Bold',
-                    method='caption'
-                )
-                
-                txt_clip = txt_clip.set_position(request_data.get('position', 'center'))
-                txt_clip = txt_clip.set_duration(request_data.get('duration_per_phrase', 2.0))
-                txt_clip = txt_clip.set_start(start_time)
-                
-                text_clips.append(txt_clip)
-
-            # Create final video with audio
-            final_video = CompositeVideoClip([video_clip] + text_clips)
-            final_video = final_video.set_audio(audio_clip)
-            
             # Save the result
             output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
-            final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
+            with stage("video_encode"):
+                final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
             
             # Clean up
             video_clip.close()
@@ -483,6 +1024,7 @@ async def generate_brainrot(
             with open(output_path, "rb") as f:
                 video_data = f.read()
                 video_base64 = base64.b64encode(video_data).decode('utf-8')
+            copy_artifact(document_id, video_artifact, output_path)
             
             # Clean up temporary files
             os.unlink(output_path)
@@ -507,4 +1049,9 @@ async def generate_brainrot(
             video_file="",
             status="error",
             error=str(e)
-        ) 
\ No newline at end of file
+        )
+
+
+import_seconds = time.perf_counter() - _import_started
+IMPORT_SECONDS.set(import_seconds)
+logger.info(f"Imported {__name__} in {import_seconds:.2f}s")
@@ -0,0 +1,133 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages take anywhere from milliseconds (cache hits) to minutes (video encode)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "researchrot_stage_seconds",
+    "Time spent in each processing stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGES_IN_PROGRESS = Gauge(
+    "researchrot_stages_in_progress",
+    "Number of stages currently running",
+    ["stage"],
+)
+REQUEST_SECONDS = Histogram(
+    "researchrot_request_seconds",
+    "Request latency per endpoint, until the response starts; for streamed responses "
+    "(/batch_query, podcast stream audio) this excludes the streamed body",
+    ["path"],
+    buckets=STAGE_BUCKETS,
+)
+IMPORT_SECONDS = Gauge(
+    "researchrot_import_seconds",
+    "Time taken to import the app module (worker cold start)",
+)
+CACHE_HITS = Counter(
+    "researchrot_cache_hits_total",
+    "Work skipped because the result was already cached",
+    ["cache"],
+)
+RETRIES = Counter(
+    "researchrot_retries_total",
+    "Retried calls to external providers",
+    ["provider"],
+)
+RATE_LIMITED = Counter(
+    "researchrot_rate_limited_total",
+    "HTTP 429 responses from external providers",
+    ["provider"],
+)
+PROVIDER_QUEUE_DEPTH = Gauge(
+    "researchrot_provider_queue_depth",
+    "Calls waiting for provider quota",
+    ["provider", "priority"],
+)
+PROVIDER_QUEUE_SECONDS = Histogram(
+    "researchrot_provider_queue_seconds",
+    "Time calls waited for provider quota",
+    ["provider", "priority"],
+    buckets=STAGE_BUCKETS,
+)
+PROVIDER_IN_FLIGHT = Gauge(
+    "researchrot_provider_in_flight",
+    "Provider calls currently holding a quota slot",
+    ["provider"],
+)
+MODEL_SECONDS = Histogram(
+    "researchrot_model_seconds",
+    "Latency of each Gemini model call by task and outcome",
+    ["task", "model", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+MODEL_FALLBACKS = Counter(
+    "researchrot_model_fallbacks_total",
+    "Calls moved to the next routed model after a timeout or error",
+    ["task", "model"],
+)
+
+# Per-request timing breakdown, shared by every task spawned while handling the request
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    """Starts a fresh timing breakdown for the current request or job."""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def snapshot_timings(timings: Dict[str, float]) -> Dict[str, float]:
+    """Returns a copy of a breakdown rounded to milliseconds, as reported in responses."""
+    return {name: round(seconds, 3) for name, seconds in timings.items()}
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    """Returns a snapshot of the current breakdown in seconds, or None outside a request."""
+    timings = _timings.get()
+    if timings is None:
+        return None
+    return snapshot_timings(timings)
+
+
+@contextmanager
+def stage(name: str):
+    """Times a processing stage.
+
+    The duration is observed in the ``researchrot_stage_seconds`` histogram and
+    added to the current request's breakdown. Stages that run several times
+    (e.g. ``tts`` per clip) are summed, so concurrent clips can add up to more
+    than the wall-clock time.
+    """
+    in_progress = STAGES_IN_PROGRESS.labels(name)
+    in_progress.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        in_progress.dec()
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+        logger.debug(f"Stage {name} took {elapsed:.3f}s")
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Formats a breakdown as a ``Server-Timing`` header value (durations in ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def latest_metrics() -> bytes:
+    return generate_latest()
@@ -0,0 +1,193 @@
+"""Pre-warms the caches for a reading list.
+
+Downloads each paper into the document store and generates its extracted
+text, summary, podcast (transcript and audio) and optionally brainrot video,
+so the first student to open a paper gets cached results. Stages that are
+already cached are skipped, and finished stages are recorded in a state file
+so an interrupted run picks up where it left off.
+
+The reading list has one arXiv ID or paper URL per line; blank lines and
+lines starting with # are ignored.
+
+Example:
+    python prewarm.py reading_list.txt --parallel 4 --brainrot
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from documents import get_document_path, has_artifact
+from quota import BATCH, set_request_context
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("text", "summary", "podcast", "brainrot")
+DEFAULT_STAGES = "text,summary,podcast"
+
+
+def read_reading_list(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        items = [line.strip() for line in f]
+    items = [item for item in items if item and not item.startswith("#")]
+    # Keep the first occurrence of papers listed twice
+    return list(dict.fromkeys(items))
+
+
+def load_state(path: str) -> Set[Tuple[str, str]]:
+    """Returns the (item, stage) pairs completed by earlier runs."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut off when the previous run was killed
+                continue
+            if entry.get("status") == "done":
+                done.add((entry["item"], entry["stage"]))
+    return done
+
+
+class Prewarmer:
+    """Runs the requested stages for each paper of a reading list."""
+
+    def __init__(self, app_module, stages: List[str], parallel: int, state_path: str,
+                 brainrot_options: Optional[Dict[str, Any]] = None):
+        self.app = app_module
+        self.stages = stages
+        # Text options for brainrot videos; left out ones use the app defaults, as the frontend does
+        self.brainrot_options = brainrot_options or {}
+        self.semaphore = asyncio.Semaphore(parallel)
+        self.done = load_state(state_path)
+        self.state_file = open(state_path, "a", encoding="utf-8")
+        self.counts: Dict[str, int] = {"done": 0, "cached": 0, "error": 0}
+
+    def close(self):
+        self.state_file.close()
+
+    def record(self, item: str, stage: str, status: str, **extra: Any):
+        self.counts[status] += 1
+        entry = {"item": item, "stage": stage, "status": "error" if status == "error" else "done", **extra}
+        self.state_file.write(json.dumps(entry) + "\n")
+        self.state_file.flush()
+
+    async def run_stage(self, stage: str, document_id: str) -> bool:
+        """Generates one stage for a stored document; returns False if it was already cached."""
+        app = self.app
+        if stage == "text":
+            if os.path.exists(get_document_path(document_id, "txt")):
+                return False
+            await app.run_in_download_pool(app.get_document_text, document_id)
+        elif stage == "summary":
+            if has_artifact(document_id, app.SUMMARY_ARTIFACT):
+                return False
+            response = await app.process_query(app.Query(document_id=document_id))
+            if response.error:
+                raise RuntimeError(response.error)
+        elif stage == "podcast":
+            if has_artifact(document_id, app.PODCAST_AUDIO_ARTIFACT):
+                return False
+            response = await app.generate_podcast_endpoint(app.PodcastRequest(document_id=document_id))
+            if response.status != "success":
+                raise RuntimeError(response.error)
+        elif stage == "brainrot":
+            request_data = {"document_id": document_id, **self.brainrot_options}
+            if has_artifact(document_id, app.get_brainrot_video_artifact(request_data)):
+                return False
+            response = await app.generate_brainrot(request=json.dumps(request_data))
+            if response.status != "success":
+                raise RuntimeError(response.error)
+        return True
+
+    async def prewarm(self, item: str):
+        """Runs every pending stage of one paper, stopping at its first failure."""
+        pending = [stage for stage in self.stages if (item, stage) not in self.done]
+        if not pending:
+            logger.info(f"{item}: already pre-warmed")
+            return
+
+        async with self.semaphore:
+            try:
+                document_id = await self.app.run_in_download_pool(self.app.fetch_document, item)
+            except Exception as e:
+                logger.error(f"{item}: download failed: {getattr(e, 'detail', e)}")
+                self.record(item, "download", "error", error=str(getattr(e, "detail", e)))
+                return
+
+            for stage in pending:
+                start = time.perf_counter()
+                try:
+                    generated = await self.run_stage(stage, document_id)
+                except Exception as e:
+                    logger.error(f"{item}: {stage} failed: {getattr(e, 'detail', e)}")
+                    self.record(item, stage, "error", document_id=document_id, error=str(getattr(e, "detail", e)))
+                    return
+                status = "done" if generated else "cached"
+                logger.info(f"{item}: {stage} {status} ({time.perf_counter() - start:.1f}s)")
+                self.record(item, stage, status, document_id=document_id)
+
+    async def run(self, items: List[str]):
+        # Pre-warming only gets provider quota that interactive and generation requests leave unused
+        set_request_context(priority=BATCH, user="prewarm")
+        await asyncio.gather(*(self.prewarm(item) for item in items))
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Pre-warm the caches for a reading list of papers")
+    parser.add_argument("reading_list", help="file with one arXiv ID or paper URL per line")
+    parser.add_argument("--parallel", type=int, default=2, help="papers processed at the same time")
+    parser.add_argument("--stages", default=DEFAULT_STAGES,
+                        help=f"comma-separated stages to generate: {', '.join(STAGES)}")
+    parser.add_argument("--brainrot", action="store_true", help="also render brainrot videos")
+    parser.add_argument("--text-color", help="brainrot text color (default: the app default)")
+    parser.add_argument("--font-size", type=int, help="brainrot font size (default: the app default)")
+    parser.add_argument("--duration-per-phrase", type=float,
+                        help="seconds each brainrot phrase is shown (default: the app default)")
+    parser.add_argument("--position", help="brainrot text position (default: the app default)")
+    parser.add_argument("--state", help="progress file used to resume (default: <reading_list>.prewarm.jsonl)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    if args.brainrot and "brainrot" not in stages:
+        stages.append("brainrot")
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        print(f"Unknown stages: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    items = read_reading_list(args.reading_list)
+    state_path = args.state or f"{args.reading_list}.prewarm.jsonl"
+
+    # Imported here so the app and its clients are only set up for an actual run
+    import main as app_module
+
+    brainrot_options = {key: value for key, value in {
+        "text_color": args.text_color,
+        "font_size": args.font_size,
+        "duration_per_phrase": args.duration_per_phrase,
+        "position": args.position,
+    }.items() if value is not None}
+    prewarmer = Prewarmer(app_module, stages, max(1, args.parallel), state_path, brainrot_options)
+    logger.info(f"Pre-warming {len(items)} papers ({', '.join(stages)}), {args.parallel} at a time")
+    try:
+        asyncio.run(prewarmer.run(items))
+    finally:
+        prewarmer.close()
+
+    counts = prewarmer.counts
+    print(f"{counts['done']} stages generated, {counts['cached']} already cached, {counts['error']} failed")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
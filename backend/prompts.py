@@ -10,6 +10,16 @@ Content:
 {content}
 """
 
+PODCAST_USER_PROMPT = """Create a podcast dialogue based on the following content. 
+        Format the response as a conversation between two speakers, followed by their dialogue.
+        Make it sound like a real podcast with natural conversation flow.
+        
+        Content:
+        {input_content}"""
+
+PODCAST_SYSTEM_PROMPT = """You are a podcast script generator. Create engaging and natural-sounding dialogue 
+        between two speakers discussing the given content. Make it sound like a real podcast conversation."""
+
 PODCAST_PROMPT = """You are a world-class dialogue producer tasked with transforming the provided input text into an engaging and informative conversation among multiple participants (ranging from 2 to 5 people). The input may be unstructured or messy, sourced from PDFs or web pages. Your goal is to extract the most interesting and insightful content for a compelling discussion.
 
 The input text will be provided in <input_text> tags.
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional
+
+from metrics import PROVIDER_IN_FLIGHT, PROVIDER_QUEUE_DEPTH, PROVIDER_QUEUE_SECONDS, stage
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+INTERACTIVE = "interactive"  # Someone is waiting on the response, e.g. /query
+GENERATION = "generation"  # Podcast and brainrot jobs
+BATCH = "batch"  # /batch_query and cache pre-warming
+PRIORITIES = (INTERACTIVE, GENERATION, BATCH)
+
+# Who a provider call is made for; set per request by the app middleware
+_priority: ContextVar[str] = ContextVar("priority", default=GENERATION)
+_user: ContextVar[str] = ContextVar("user", default="anonymous")
+
+
+def set_request_context(priority: Optional[str] = None, user: Optional[str] = None):
+    """Sets the priority class and user that provider calls from the current context are queued under."""
+    if priority is not None:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        _priority.set(priority)
+    if user is not None:
+        _user.set(user)
+
+
+class ProviderScheduler:
+    """Shares one provider's concurrency and rate budget between all requests.
+
+    Waiting calls are served strictly by priority class. Within a class, users
+    take turns, so one user's long podcast can't hold up everyone else. The
+    last ``reserved`` slots are kept for interactive calls, so a summary never
+    waits for a whole generation job to finish. ``requests_per_minute`` (0 for
+    no limit) is enforced with a token bucket of ``max_concurrency`` tokens.
+    """
+
+    def __init__(self, provider: str, max_concurrency: int, requests_per_minute: float = 0, reserved: int = 0):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved = max(0, min(reserved, self.max_concurrency - 1))
+        self.rate = requests_per_minute / 60
+        self.tokens = float(self.max_concurrency)
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        # priority -> user -> waiting calls, users in round-robin order
+        self.queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in PRIORITIES
+        }
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits for a turn under the current priority and user, and holds it for the block."""
+        priority, user = _priority.get(), _user.get()
+        with stage(f"{self.provider}_queue"):
+            await self._acquire(priority, user)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _limit(self, priority: str) -> int:
+        return self.max_concurrency if priority == INTERACTIVE else self.max_concurrency - self.reserved
+
+    async def _acquire(self, priority: str, user: str):
+        queued_at = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self.queues[priority].setdefault(user, deque()).append(waiter)
+        PROVIDER_QUEUE_DEPTH.labels(self.provider, priority).inc()
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller was cancelled
+                self._release()
+            raise
+        PROVIDER_QUEUE_SECONDS.labels(self.provider, priority).observe(time.perf_counter() - queued_at)
+
+    def _release(self):
+        self.in_flight -= 1
+        PROVIDER_IN_FLIGHT.labels(self.provider).dec()
+        self._dispatch()
+
+    def _pop(self, priority: str) -> asyncio.Future:
+        """Takes the next waiter of a class, moving its user to the back of the round."""
+        users = self.queues[priority]
+        user, waiters = next(iter(users.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            users.move_to_end(user)
+        else:
+            del users[user]
+        PROVIDER_QUEUE_DEPTH.labels(self.provider, priority).dec()
+        return waiter
+
+    def _ready_priority(self) -> Optional[str]:
+        """Returns the most urgent class with a waiting call that may start now."""
+        for priority in PRIORITIES:
+            users = self.queues[priority]
+            # Drop calls cancelled while they were queued
+            while users and next(iter(users.values()))[0].done():
+                self._pop(priority)
+            if users and self.in_flight < self._limit(priority):
+                return priority
+        return None
+
+    def _take_token(self) -> float:
+        """Takes a rate budget token; returns how long to wait if there is none."""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        self.tokens = min(self.max_concurrency, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def _dispatch(self):
+        while True:
+            priority = self._ready_priority()
+            if priority is None:
+                return
+            delay = self._take_token()
+            if delay:
+                self._retry_after(delay)
+                return
+            self.in_flight += 1
+            PROVIDER_IN_FLIGHT.labels(self.provider).inc()
+            self._pop(priority).set_result(None)
+
+    def _retry_after(self, delay: float):
+        loop = asyncio.get_running_loop()
+        # A timer left over from a loop that has since closed (e.g. a finished asyncio.run) never fires
+        if self._timer is not None and self._timer_loop is loop:
+            return
+        logger.debug(f"{self.provider} rate budget exhausted, next call in {delay:.2f}s")
+        self._timer = loop.call_later(delay, self._on_timer)
+        self._timer_loop = loop
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+# Slots kept free of generation and batch work for interactive calls. No interactive
+# endpoint uses text-to-speech, so ElevenLabs reserves none by default.
+INTERACTIVE_RESERVED = int(os.getenv("INTERACTIVE_RESERVED_SLOTS", "1"))
+ELEVENLABS_INTERACTIVE_RESERVED = int(os.getenv("ELEVENLABS_INTERACTIVE_RESERVED_SLOTS", "0"))
+
+gemini_quota = ProviderScheduler(
+    "gemini",
+    max_concurrency=int(os.getenv("GEMINI_CONCURRENCY", "4")),
+    requests_per_minute=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0")),
+    reserved=INTERACTIVE_RESERVED,
+)
+elevenlabs_quota = ProviderScheduler(
+    "elevenlabs",
+    max_concurrency=int(os.getenv("ELEVENLABS_CONCURRENCY", "4")),
+    requests_per_minute=float(os.getenv("ELEVENLABS_REQUESTS_PER_MINUTE", "0")),
+    reserved=ELEVENLABS_INTERACTIVE_RESERVED,
+)
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from metrics import MODEL_FALLBACKS, MODEL_SECONDS, stage
+
+logger = logging.getLogger(__name__)
+
+# Model routing table: for each task, a list of routes tried in order until one's
+# "max_chars" (omit for no limit) fits the input. A route gives the models to try
+# in order and a "timeout" in seconds per attempt (for streams, the longest wait
+# for the stream to open or for its next chunk). Edit the file, or point MODEL_ROUTES at another one, to re-route
+# without code changes; it is re-read when it changes.
+MODEL_ROUTES_PATH = os.getenv("MODEL_ROUTES", os.path.join(os.path.dirname(__file__), "model_routes.json"))
+
+# Used for tasks missing from the table
+DEFAULT_MODEL = "gemini-2.5-pro-exp-03-25"
+DEFAULT_TIMEOUT = 180.0
+
+_routes: Dict[str, List[Dict[str, Any]]] = {}
+_routes_mtime: Optional[float] = None
+
+
+def load_routes() -> Dict[str, List[Dict[str, Any]]]:
+    """Returns the routing table, reloading it if the file changed."""
+    global _routes, _routes_mtime
+    try:
+        mtime = os.path.getmtime(MODEL_ROUTES_PATH)
+    except OSError:
+        logger.warning(f"Model routes not found at {MODEL_ROUTES_PATH}, using {DEFAULT_MODEL} for every task")
+        return {}
+    if mtime != _routes_mtime:
+        try:
+            with open(MODEL_ROUTES_PATH, encoding="utf-8") as f:
+                routes = json.load(f)
+            for task, task_routes in routes.items():
+                for route in task_routes:
+                    if not route.get("models"):
+                        raise ValueError(f"Route for {task} has no models")
+        except (OSError, ValueError) as e:
+            # Keep serving with the last good table rather than failing every request
+            logger.error(f"Invalid model routes in {MODEL_ROUTES_PATH}: {e}")
+            _routes_mtime = mtime
+            return _routes
+        _routes, _routes_mtime = routes, mtime
+        logger.info(f"Loaded model routes for {', '.join(routes)} from {MODEL_ROUTES_PATH}")
+    return _routes
+
+
+def route_models(task: str, input_chars: int) -> Dict[str, Any]:
+    """Picks the route (models in order and timeout) for a task and input size."""
+    for route in load_routes().get(task, []):
+        max_chars = route.get("max_chars")
+        if max_chars is None or input_chars <= max_chars:
+            return {"models": route["models"], "timeout": float(route.get("timeout", DEFAULT_TIMEOUT))}
+    return {"models": [DEFAULT_MODEL], "timeout": DEFAULT_TIMEOUT}
+
+
+def record_model_call(task: str, model: str, outcome: str, seconds: float):
+    MODEL_SECONDS.labels(task, model, outcome).observe(seconds)
+    logger.info(f"Model {model} for {task}: {outcome} in {seconds:.2f}s")
+
+
+def record_fallback(task: str, model: str, next_model: str, error: Exception):
+    MODEL_FALLBACKS.labels(task, model).inc()
+    logger.warning(f"Model {model} failed for {task} ({type(error).__name__}: {error}), falling back to {next_model}")
+
+
+def _handle_failure(task: str, models: List[str], i: int, error: Exception, seconds: float,
+                    on_error: Optional[Callable[[Exception], None]], can_fall_back: bool = True) -> bool:
+    """Records a failed attempt on ``models[i]``; returns whether to fall back to the next model."""
+    outcome = "timeout" if isinstance(error, asyncio.TimeoutError) else "error"
+    record_model_call(task, models[i], outcome, seconds)
+    if on_error:
+        on_error(error)
+    if not can_fall_back or i == len(models) - 1:
+        return False
+    record_fallback(task, models[i], models[i + 1], error)
+    return True
+
+
+async def call_with_fallback(task: str, input_chars: int, call: Callable[[str], Awaitable[Any]],
+                             slot: Callable[[], AsyncContextManager],
+                             on_error: Optional[Callable[[Exception], None]] = None) -> Any:
+    """Runs ``call(model)`` on the routed models in order until one succeeds.
+
+    Each attempt holds ``slot()`` (the provider's quota) and is timed from when
+    the slot is granted, so queueing is not counted against the model. The last
+    model's error is raised if every model fails.
+    """
+    route = route_models(task, input_chars)
+    models = route["models"]
+    for i, model in enumerate(models):
+        async with slot():
+            start = time.perf_counter()
+            try:
+                with stage("llm"):
+                    result = await asyncio.wait_for(call(model), route["timeout"])
+            except Exception as e:
+                if not _handle_failure(task, models, i, e, time.perf_counter() - start, on_error):
+                    raise
+                continue
+            record_model_call(task, model, "success", time.perf_counter() - start)
+            return result
+
+
+async def stream_with_fallback(task: str, input_chars: int, open_stream: Callable[[str], Awaitable[AsyncIterator[Any]]],
+                               slot: Callable[[], AsyncContextManager],
+                               on_error: Optional[Callable[[Exception], None]] = None) -> AsyncIterator[Any]:
+    """Yields the chunks of ``open_stream(model)`` from the first routed model that works.
+
+    The slot is held until the stream ends. A model that goes quiet for longer
+    than the route's timeout fails the stream; before its first chunk that falls
+    back to the next model, once output has been yielded the error is raised.
+    """
+    route = route_models(task, input_chars)
+    models, timeout = route["models"], route["timeout"]
+    for i, model in enumerate(models):
+        async with slot():
+            start = time.perf_counter()
+            streaming = False
+            try:
+                with stage("llm"):
+                    chunks = (await asyncio.wait_for(open_stream(model), timeout)).__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        streaming = True
+                        yield chunk
+            except Exception as e:
+                if not _handle_failure(task, models, i, e, time.perf_counter() - start, on_error,
+                                       can_fall_back=not streaming):
+                    raise
+                continue
+            record_model_call(task, model, "success", time.perf_counter() - start)
+            return
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The backend modules are imported as top-level modules, as the app runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Stores are created at import time, so point them somewhere disposable first
+os.environ.setdefault("DOCUMENT_DIR", tempfile.mkdtemp(prefix="researchrot-documents-"))
+os.environ.setdefault("AUDIO_DIR", tempfile.mkdtemp(prefix="researchrot-audio-"))
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+from moviepy.video.io import ffmpeg_reader
+
+import backgrounds
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    pool_dir = tmp_path / "pool"
+    monkeypatch.setattr(backgrounds, "BACKGROUND_DIR", str(pool_dir))
+    monkeypatch.setattr(backgrounds, "_manifest_mtime", None)
+    # Stand-ins for ffmpeg: "transcoding" copies the source, which holds its duration
+    monkeypatch.setattr(backgrounds, "transcode_background",
+                        lambda source, output_path: os.link(source, output_path))
+    monkeypatch.setattr(ffmpeg_reader, "ffmpeg_parse_infos",
+                        lambda path: {"duration": float(open(path).read())})
+    return pool_dir
+
+
+def make_source(tmp_path, name, duration):
+    path = tmp_path / name
+    path.write_text(str(duration))
+    return str(path)
+
+
+def pooled(pool_dir):
+    return sorted(name for name in os.listdir(pool_dir) if name.endswith(".mp4"))
+
+
+def sources_in(manifest):
+    return sorted(os.path.basename(clip["source"]) for clip in manifest["clips"])
+
+
+def test_explicit_sources_are_added_to_the_pool(tmp_path, pool):
+    first = make_source(tmp_path, "a.mov", 10)
+    second = make_source(tmp_path, "b.mov", 20)
+    backgrounds.prepare_backgrounds([first, second], replace=True)
+
+    manifest = backgrounds.prepare_backgrounds([make_source(tmp_path, "new.mov", 30)])
+    assert sources_in(manifest) == ["a.mov", "b.mov", "new.mov"]
+    assert len(pooled(pool)) == 3
+
+
+def test_changed_source_replaces_its_old_intermediate(tmp_path, pool):
+    first = make_source(tmp_path, "a.mov", 10)
+    second = make_source(tmp_path, "b.mov", 20)
+    backgrounds.prepare_backgrounds([first, second], replace=True)
+    before = set(pooled(pool))
+
+    os.unlink(first)
+    make_source(tmp_path, "a.mov", 15)
+    os.utime(first, (1, 1))
+    manifest = backgrounds.prepare_backgrounds([first])
+    assert sources_in(manifest) == ["a.mov", "b.mov"]
+    assert {clip["duration"] for clip in manifest["clips"]} == {15.0, 20.0}
+    assert len(pooled(pool)) == 2
+    assert len(set(pooled(pool)) - before) == 1
+
+
+def test_rebuild_drops_unlisted_clips(tmp_path, pool):
+    first = make_source(tmp_path, "a.mov", 10)
+    second = make_source(tmp_path, "b.mov", 20)
+    backgrounds.prepare_backgrounds([first, second], replace=True)
+
+    manifest = backgrounds.prepare_backgrounds([second], replace=True)
+    assert sources_in(manifest) == ["b.mov"]
+    assert pooled(pool) == [clip["file"] for clip in manifest["clips"]]
@@ -0,0 +1,61 @@
+import json
+import random
+
+import pytest
+
+from dialogue_stream import DialogueStreamParser
+
+DIALOGUE = [
+    {"speaker": "Jessica", "text": "Welcome back! Today: {braces}, [brackets] and \"quotes\"."},
+    {"speaker": "Michael", "text": "A backslash \\ and a closing brace } in text.",
+     "overlaps": [{"speaker": "Jessica", "text": "Right, {nested}!"}]},
+    {"speaker": "Jessica", "text": "Unicode – works too."},
+]
+
+TRANSCRIPT = (
+    "<scratchpad>Mention the <dialogue> tag in prose first.</scratchpad>\n"
+    f"<dialogue>\n{json.dumps(DIALOGUE, indent=2)}\n</dialogue>\nTrailing notes."
+)
+
+
+def split_randomly(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, 40)))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_chunk_splits_yield_every_line_in_order(seed):
+    parser = DialogueStreamParser()
+    lines = []
+    for chunk in split_randomly(TRANSCRIPT, random.Random(seed)):
+        lines.extend(parser.feed(chunk))
+
+    assert lines == DIALOGUE
+    assert parser.lines == DIALOGUE
+    assert parser.done
+
+
+def test_single_character_chunks():
+    parser = DialogueStreamParser()
+    lines = [line for char in TRANSCRIPT for line in parser.feed(char)]
+    assert lines == DIALOGUE
+
+
+def test_lines_are_released_before_the_array_closes():
+    parser = DialogueStreamParser()
+    first_line = json.dumps(DIALOGUE[0])
+    assert parser.feed(f"<dialogue>[{first_line}, {{\"speaker\": ") == [DIALOGUE[0]]
+    assert not parser.done
+
+
+def test_markdown_emphasis_is_stripped():
+    parser = DialogueStreamParser()
+    assert parser.feed('<dialogue>[{"speaker": "Jessica", "text": "a *big* deal"}]') == [
+        {"speaker": "Jessica", "text": "a big deal"}
+    ]
+
+
+def test_invalid_array_content_raises():
+    parser = DialogueStreamParser()
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed("<dialogue>[oops]")
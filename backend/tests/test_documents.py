@@ -0,0 +1,77 @@
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from documents import UploadSpooler, get_document_path
+
+BOUNDARY = "researchrot-test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 64 + b"\n%%EOF\n"
+
+
+def multipart_body(content: bytes, field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="paper.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def upload(chunks):
+    spooler = UploadSpooler(CONTENT_TYPE)
+    try:
+        for chunk in chunks:
+            spooler.write(chunk)
+        return spooler, spooler.finish()
+    except Exception:
+        spooler.discard()
+        raise
+
+
+def test_single_write_stores_the_pdf_under_its_hash():
+    spooler, document_id = upload([multipart_body(PDF)])
+    assert document_id == hashlib.sha256(PDF).hexdigest()
+    assert spooler.filename == "paper.pdf"
+    assert spooler.size == len(PDF)
+    with open(get_document_path(document_id), "rb") as f:
+        assert f.read() == PDF
+
+
+@pytest.mark.parametrize("into_file", [1, 2, 3, 4, 5, 100])
+def test_body_split_inside_the_file_is_accepted(into_file):
+    body = multipart_body(PDF)
+    split = body.index(PDF) + into_file
+    _, document_id = upload([body[:split], body[split:]])
+    assert document_id == hashlib.sha256(PDF).hexdigest()
+
+
+def test_byte_by_byte_body_is_accepted():
+    body = multipart_body(PDF)
+    _, document_id = upload([body[i:i + 1] for i in range(len(body))])
+    assert document_id == hashlib.sha256(PDF).hexdigest()
+
+
+@pytest.mark.parametrize("content", [b"%PD", b"%PNG not a pdf", b"hello"])
+def test_non_pdf_is_rejected_whatever_the_split(content):
+    body = multipart_body(content)
+    for split in range(len(body)):
+        with pytest.raises(HTTPException) as error:
+            upload([body[:split], body[split:]])
+        assert error.value.status_code == 400
+
+
+def test_missing_field_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        upload([multipart_body(PDF, field="other")])
+    assert error.value.status_code == 400
+
+
+def test_oversized_upload_is_rejected_and_cleaned_up():
+    spooler = UploadSpooler(CONTENT_TYPE, max_bytes=1024)
+    with pytest.raises(HTTPException) as error:
+        spooler.write(multipart_body(PDF))
+    spooler.discard()
+    assert error.value.status_code == 413
+    assert not os.path.exists(spooler.writer.temp_path)
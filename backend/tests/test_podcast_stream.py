@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import json
+
+import pytest
+from pydub.generators import Sine
+
+import main
+import voiceover
+from documents import get_artifact_path, read_artifact, write_artifact
+
+TRANSCRIPT = [{"speaker": "Jessica", "text": "Hello there"}, {"speaker": "Eric", "text": "Hi Jessica"}]
+
+
+@pytest.fixture
+def document_id(request):
+    # Artifacts live under a fake document ID, one per test
+    document_id = hashlib.sha256(request.node.name.encode("utf-8")).hexdigest()
+    write_artifact(document_id, main.PODCAST_TRANSCRIPT_ARTIFACT, json.dumps(TRANSCRIPT).encode("utf-8"))
+    return document_id
+
+
+def run_stream(document_id):
+    async def run():
+        stream = main.PodcastStream("test")
+        job = asyncio.create_task(main.run_podcast_stream(stream, main.PodcastRequest(document_id=document_id)))
+        audio = b"".join([data async for data in stream.audio()])
+        await job
+        return stream, audio
+    return asyncio.run(run())
+
+
+def test_cached_podcast_audio_is_served(document_id, monkeypatch):
+    write_artifact(document_id, main.PODCAST_AUDIO_ARTIFACT, b"RIFF cached podcast")
+
+    async def generate_audio(line, output_dir):
+        raise AssertionError("cached podcasts need no synthesis")
+
+    monkeypatch.setattr(voiceover, "generate_audio", generate_audio)
+
+    stream, audio = run_stream(document_id)
+    assert stream.status == "success"
+    assert stream.parser.lines == TRANSCRIPT
+    assert audio == b"RIFF cached podcast"
+
+
+def test_streamed_podcast_audio_is_stored_for_later_listeners(document_id, monkeypatch):
+    clip = Sine(440).to_audio_segment(duration=500).set_channels(1).set_sample_width(2)
+
+    async def generate_audio(line, output_dir):
+        pass
+
+    monkeypatch.setattr(voiceover, "generate_audio", generate_audio)
+    monkeypatch.setattr(voiceover, "render_line", lambda line, output_dir: clip)
+
+    stream, audio = run_stream(document_id)
+    assert stream.status == "success"
+    assert audio.startswith(b"RIFF")
+    assert read_artifact(document_id, main.PODCAST_AUDIO_ARTIFACT).startswith(b"RIFF")
+
+    _, cached_audio = run_stream(document_id)
+    with open(get_artifact_path(document_id, main.PODCAST_AUDIO_ARTIFACT), "rb") as f:
+        assert cached_audio == f.read()
+
+
+def test_stream_status_reports_rounded_timings(document_id):
+    write_artifact(document_id, main.PODCAST_AUDIO_ARTIFACT, b"RIFF cached podcast")
+    stream, _ = run_stream(document_id)
+    stream.timings["llm"] = 1.23456789
+    main.podcast_streams[stream.stream_id] = stream
+    try:
+        status = asyncio.run(main.get_podcast_stream(stream.stream_id))
+    finally:
+        del main.podcast_streams[stream.stream_id]
+    assert status.timings["llm"] == 1.235
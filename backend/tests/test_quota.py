@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from quota import BATCH, GENERATION, INTERACTIVE, ProviderScheduler, set_request_context
+
+
+async def call(scheduler, order, priority, user, tag, hold=0.02):
+    set_request_context(priority=priority, user=user)
+    async with scheduler.slot():
+        order.append(tag)
+        await asyncio.sleep(hold)
+
+
+async def queue_behind_blocker(scheduler, order, calls):
+    """Occupies every non-reserved slot, queues ``calls`` behind it and runs everything."""
+    blockers = [asyncio.create_task(call(scheduler, order, GENERATION, "blocker", "blocker", hold=0.1))
+                for _ in range(scheduler.max_concurrency - scheduler.reserved)]
+    await asyncio.sleep(0.01)
+    tasks = [asyncio.create_task(call(scheduler, order, *args)) for args in calls]
+    await asyncio.gather(*blockers, *tasks)
+
+
+def test_higher_priority_classes_go_first():
+    scheduler = ProviderScheduler("test", max_concurrency=1)
+    order = []
+    asyncio.run(queue_behind_blocker(scheduler, order, [
+        (BATCH, "a", "batch"),
+        (GENERATION, "a", "generation"),
+        (INTERACTIVE, "a", "interactive"),
+    ]))
+    assert order == ["blocker", "interactive", "generation", "batch"]
+
+
+def test_users_take_turns_within_a_class():
+    scheduler = ProviderScheduler("test", max_concurrency=1)
+    order = []
+    asyncio.run(queue_behind_blocker(scheduler, order, [
+        (GENERATION, "big", "big0"),
+        (GENERATION, "big", "big1"),
+        (GENERATION, "big", "big2"),
+        (GENERATION, "small", "small0"),
+        (GENERATION, "small", "small1"),
+    ]))
+    assert order == ["blocker", "big0", "small0", "big1", "small1", "big2"]
+
+
+def test_reserved_slot_is_only_used_by_interactive_calls():
+    scheduler = ProviderScheduler("test", max_concurrency=2, reserved=1)
+    order = []
+    asyncio.run(queue_behind_blocker(scheduler, order, [
+        (GENERATION, "a", "generation"),
+        (INTERACTIVE, "b", "interactive"),
+    ]))
+    # The interactive call starts on the reserved slot while the blocker still runs
+    assert order == ["blocker", "interactive", "generation"]
+
+
+def test_cancelled_waiters_are_skipped():
+    scheduler = ProviderScheduler("test", max_concurrency=1)
+    order = []
+
+    async def run():
+        blocker = asyncio.create_task(call(scheduler, order, GENERATION, "a", "blocker", hold=0.05))
+        await asyncio.sleep(0.01)
+        cancelled = asyncio.create_task(call(scheduler, order, GENERATION, "b", "cancelled"))
+        waiting = asyncio.create_task(call(scheduler, order, GENERATION, "c", "waiting"))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        await asyncio.gather(blocker, waiting)
+
+    asyncio.run(run())
+    assert order == ["blocker", "waiting"]
+    assert scheduler.in_flight == 0
+    assert all(not users for users in scheduler.queues.values())
+
+
+def test_rate_budget_spaces_out_calls():
+    # 600 per minute is one every 0.1 s after a burst of max_concurrency
+    scheduler = ProviderScheduler("test", max_concurrency=2, requests_per_minute=600)
+    order = []
+
+    async def run():
+        await asyncio.gather(*(call(scheduler, order, BATCH, "a", i, hold=0) for i in range(5)))
+
+    start = time.monotonic()
+    asyncio.run(run())
+    assert 0.25 <= time.monotonic() - start < 1.0
+    assert sorted(order) == list(range(5))
@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import routing
+from routing import call_with_fallback, stream_with_fallback
+
+MODELS = ["primary", "fallback"]
+
+
+@pytest.fixture
+def route(monkeypatch):
+    timeout = {"value": 0.2}
+    monkeypatch.setattr(routing, "route_models",
+                        lambda task, input_chars: {"models": MODELS, "timeout": timeout["value"]})
+    return timeout
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(routing, "record_model_call",
+                        lambda task, model, outcome, seconds: recorded.append((model, outcome, seconds)))
+    return recorded
+
+
+def slot_after(delay):
+    @asynccontextmanager
+    async def slot():
+        await asyncio.sleep(delay)
+        yield
+    return slot
+
+
+def collect(stream):
+    async def run():
+        return [chunk async for chunk in stream]
+    return asyncio.run(run())
+
+
+async def chunks(*items, delay=0.0):
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+def test_call_time_excludes_the_wait_for_a_slot(route, calls):
+    async def call(model):
+        return model
+
+    assert asyncio.run(call_with_fallback("task", 0, call, slot=slot_after(0.3))) == "primary"
+    # Queueing for longer than the timeout neither times out the call nor shows in its latency
+    [(model, outcome, seconds)] = calls
+    assert (model, outcome) == ("primary", "success")
+    assert seconds < 0.1
+
+
+def test_call_falls_back_on_timeout(route, calls):
+    async def call(model):
+        if model == "primary":
+            await asyncio.sleep(1)
+        return model
+
+    errors = []
+    assert asyncio.run(call_with_fallback("task", 0, call, slot=slot_after(0), on_error=errors.append)) == "fallback"
+    assert [(model, outcome) for model, outcome, _ in calls] == [("primary", "timeout"), ("fallback", "success")]
+    assert len(errors) == 1 and isinstance(errors[0], asyncio.TimeoutError)
+
+
+def test_call_raises_the_last_error(route, calls):
+    async def call(model):
+        raise ValueError(model)
+
+    with pytest.raises(ValueError, match="fallback"):
+        asyncio.run(call_with_fallback("task", 0, call, slot=slot_after(0)))
+
+
+def test_stream_falls_back_before_the_first_chunk(route, calls):
+    async def open_stream(model):
+        if model == "primary":
+            return chunks("never", delay=1)
+        return chunks("a", "b")
+
+    assert collect(stream_with_fallback("task", 0, open_stream, slot=slot_after(0))) == ["a", "b"]
+    assert [(model, outcome) for model, outcome, _ in calls] == [("primary", "timeout"), ("fallback", "success")]
+
+
+def test_stream_timeout_applies_to_each_chunk(route, calls):
+    async def open_stream(model):
+        # Longer than the timeout in total, but no single wait is
+        return chunks("a", "b", "c", "d", delay=0.1)
+
+    assert collect(stream_with_fallback("task", 0, open_stream, slot=slot_after(0))) == ["a", "b", "c", "d"]
+
+
+def test_stalled_stream_raises_after_output(route, calls):
+    async def stalls_after_first_chunk():
+        yield "a"
+        await asyncio.sleep(1)
+        yield "b"
+
+    async def open_stream(model):
+        return stalls_after_first_chunk()
+
+    received = []
+
+    async def run():
+        async for chunk in stream_with_fallback("task", 0, open_stream, slot=slot_after(0)):
+            received.append(chunk)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert received == ["a"]
+    assert [(model, outcome) for model, outcome, _ in calls] == [("primary", "timeout")]
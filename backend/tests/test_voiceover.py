@@ -0,0 +1,108 @@
+import asyncio
+import gc
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+import voiceover
+from voiceover import AudioStreamJoiner, join_audio_clips, stream_dialogue_audio, wav_stream_header
+
+
+def make_clips():
+    # Lengths in whole MP3 frames (1152 samples), as ElevenLabs clips are
+    return [
+        Sine(220 + 40 * i).to_audio_segment(duration=1000).set_channels(1).set_sample_width(2)
+        .get_sample_slice(0, 1152 * (20 + 3 * i))
+        for i in range(6)
+    ]
+
+
+def stream_clips(clips):
+    joiner = AudioStreamJoiner()
+    return b"".join(joiner.add(clip) for clip in clips) + joiner.flush()
+
+
+def assert_matches_batch_join(streamed, batch, boundaries):
+    # Both joins round crossfade positions to milliseconds; they may differ by a sample per boundary
+    assert abs(len(streamed) - len(batch.raw_data)) <= boundaries * batch.frame_width
+    first_boundary = (1152 * 20 - batch.frame_rate // 100) * batch.frame_width
+    assert streamed[:first_boundary] == batch.raw_data[:first_boundary]
+
+
+def test_stream_joiner_matches_batch_join(tmp_path, monkeypatch):
+    clips = make_clips()
+    dialogue = [{"speaker": "Jessica", "text": str(i)} for i in range(len(clips))]
+    monkeypatch.setattr(voiceover, "render_line", lambda line, output_dir: clips[int(line["text"])])
+
+    batch = AudioSegment.from_wav(join_audio_clips(dialogue, output_dir=str(tmp_path), output_file="batch.wav"))
+
+    assert_matches_batch_join(stream_clips(clips), batch, len(clips) - 1)
+
+
+def test_stream_dialogue_audio_sends_a_wav_header_then_pcm(monkeypatch):
+    clips = make_clips()
+    monkeypatch.setattr(voiceover, "render_line", lambda line, output_dir: clips[line["index"]])
+
+    async def lines():
+        for i in range(len(clips)):
+            ready = asyncio.get_running_loop().create_future()
+            ready.set_result(None)
+            yield {"index": i}, ready
+
+    async def collect():
+        return [chunk async for chunk in stream_dialogue_audio(lines(), output_dir="unused")]
+
+    chunks = asyncio.run(collect())
+    clip = clips[0]
+    assert chunks[0] == wav_stream_header(clip.frame_rate, clip.channels, clip.sample_width)
+    assert b"".join(chunks[1:]) == stream_clips(clips)
+
+
+def test_stream_dialogue_audio_skips_lines_whose_clips_failed(tmp_path, monkeypatch):
+    clips = make_clips()
+    failed = {2}
+
+    async def generate_audio(line, output_dir):
+        if line["index"] in failed:
+            raise RuntimeError("tts down")
+
+    # A failed line has no clip on disk, so render_line finds nothing for it
+    monkeypatch.setattr(voiceover, "generate_audio", generate_audio)
+    monkeypatch.setattr(voiceover, "render_line",
+                        lambda line, output_dir: None if line["index"] in failed else clips[line["index"]])
+
+    async def collect():
+        scheduler = voiceover.VoiceClipScheduler(str(tmp_path))
+        lines = [{"index": i} for i in range(len(clips))]
+
+        async def submitted():
+            for line in lines:
+                yield line, scheduler.submit(line)
+
+        return [chunk async for chunk in stream_dialogue_audio(submitted(), output_dir=str(tmp_path))]
+
+    chunks = asyncio.run(collect())
+    # The rest of the podcast is still streamed, held-back tail included
+    assert b"".join(chunks[1:]) == stream_clips([clip for i, clip in enumerate(clips) if i not in failed])
+
+
+def test_failed_clips_are_not_reported_as_unretrieved(tmp_path, monkeypatch):
+    async def fail(line, output_dir):
+        raise RuntimeError("tts down")
+
+    monkeypatch.setattr(voiceover, "generate_audio", fail)
+    unhandled = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        scheduler = voiceover.VoiceClipScheduler(str(tmp_path))
+        scheduler.submit({"speaker": "Jessica", "text": "hi"})  # future dropped, as generate_voice_clips does
+        try:
+            await scheduler.wait()
+        except RuntimeError:
+            pass
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    gc.collect()
+    assert not unhandled
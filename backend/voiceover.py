@@ -1,8 +1,8 @@
 import os
 from dotenv import load_dotenv
 import hashlib
-import queue
-from typing import List, Dict, Any
+import struct
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
 from pydub import AudioSegment
 from tqdm.auto import tqdm
 import httpx
@@ -10,6 +10,8 @@ import backoff
 import asyncio
 import json
 import logging
+from metrics import CACHE_HITS, RATE_LIMITED, RETRIES, stage
+from quota import elevenlabs_quota
 
 # Configure logging
 logging.basicConfig(
@@ -21,14 +23,21 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 ELEVEN_LABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-ELEVEN_LABS_API_URL = "https://api.elevenlabs.io/v1/text-to-speech"
+ELEVEN_LABS_API_URL = os.getenv("ELEVENLABS_API_URL", "https://api.elevenlabs.io/v1/text-to-speech")
 
 # Create audio directory if it doesn't exist
-AUDIO_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "audio")
+AUDIO_DIR = os.getenv("AUDIO_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "audio"))
 if not os.path.exists(AUDIO_DIR):
     os.makedirs(AUDIO_DIR)
     logger.info(f"Created audio directory: {AUDIO_DIR}")
 
+# Overlapping speech starts this long before the end of the interrupted line
+OVERLAP_MS = 850
+# Crossfade between consecutive dialogue lines
+CROSSFADE_MS = 10
+# Placeholder RIFF/data size for WAV streams whose length is not known up front
+STREAM_DATA_SIZE = 0xFFFFFFFF
+
 # Voice IDs mapping
 VOICE_IDS = {
     "Jessica": "21m00Tcm4TlvDq8ikWAM",  # Female, soft and caring voice
@@ -43,97 +52,171 @@ def get_clip_filename(speaker: str, text: str, output_dir: str):
     logger.debug(f"Generated filename for {speaker}: {filename}")
     return filename
 
-async def generate_voice_clips(dialogue: List[Dict[str, Any]], output_dir: str = AUDIO_DIR):
-    logger.info(f"Starting voice clip generation for {len(dialogue)} dialogue segments")
-    logger.debug(f"Dialogue content: {json.dumps(dialogue, indent=2)}")
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        logger.info(f"Created output directory: {output_dir}")
+@backoff.on_exception(backoff.expo,
+                      (httpx.HTTPStatusError, httpx.RequestError),
+                      max_tries=5,
+                      giveup=lambda e: isinstance(e, httpx.HTTPStatusError) and e.response.status_code != 429,
+                      on_backoff=lambda details: RETRIES.labels("elevenlabs").inc())
+async def generate_audio(line: Dict[str, Any], output_dir: str = AUDIO_DIR):
+    speaker = line.get("speaker")
+    text = line.get("text")
+    voice_id = VOICE_IDS.get(speaker)
 
-    dialogue_queue = queue.Queue()
-    for line in dialogue:
-        dialogue_queue.put(line)
-        if "overlaps" in line:
-            for overlap in line.get("overlaps", []):
-                dialogue_queue.put(overlap)
-    logger.info(f"Added {dialogue_queue.qsize()} items to the queue")
-
-    @backoff.on_exception(backoff.expo,
-                          (httpx.HTTPStatusError, httpx.RequestError),
-                          max_tries=5,
-                          giveup=lambda e: isinstance(e, httpx.HTTPStatusError) and e.response.status_code != 429)
-    async def generate_audio(line, previous_text=None):
-        speaker = line.get("speaker")
-        text = line.get("text")
-        voice_id = VOICE_IDS.get(speaker)
-        
-        logger.info(f"Processing audio for {speaker}: {text[:50]}...")
-        
-        if not voice_id:
-            logger.warning(f"No voice ID found for speaker {speaker}")
-            return
-            
-        filename = get_clip_filename(speaker, text, output_dir)
-        if os.path.exists(filename):
-            logger.info(f"Audio clip already exists: {filename}")
-            return
-
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVEN_LABS_API_KEY
-        }
-        
-        data = {
-            "text": text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.75,
-                "style": 0.0,
-                "use_speaker_boost": True
-            }
+    logger.info(f"Processing audio for {speaker}: {text[:50]}...")
+
+    if not voice_id:
+        logger.warning(f"No voice ID found for speaker {speaker}")
+        return
+
+    filename = get_clip_filename(speaker, text, output_dir)
+    if os.path.exists(filename):
+        CACHE_HITS.labels("tts").inc()
+        logger.info(f"Audio clip already exists: {filename}")
+        return
+
+    headers = {
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVEN_LABS_API_KEY
+    }
+
+    data = {
+        "text": text,
+        "model_id": "eleven_monolingual_v1",
+        "voice_settings": {
+            "stability": 0.5,
+            "similarity_boost": 0.75,
+            "style": 0.0,
+            "use_speaker_boost": True
         }
-        
-        try:
-            logger.debug(f"Sending request to ElevenLabs API for {speaker}")
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{ELEVEN_LABS_API_URL}/{voice_id}",
-                    headers=headers,
-                    json=data
-                )
-                response.raise_for_status()
-                
+    }
+
+    try:
+        logger.debug(f"Sending request to ElevenLabs API for {speaker}")
+        # Queued with every other ElevenLabs call; each retry queues again
+        async with elevenlabs_quota.slot():
+            with stage("tts"):
+                async with httpx.AsyncClient(timeout=60.0) as client:
+                    response = await client.post(
+                        f"{ELEVEN_LABS_API_URL}/{voice_id}",
+                        headers=headers,
+                        json=data
+                    )
+                    response.raise_for_status()
+
                 with open(filename, "wb") as f:
                     f.write(response.content)
                 logger.info(f"Successfully saved audio clip: {filename}")
-                
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Failed to generate audio for {speaker}: {e}")
-            logger.error(f"Response content: {e.response.text}")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected error generating audio for {speaker}: {e}")
-            raise
-
-    semaphore = asyncio.Semaphore(2)
-    tasks = []
-    previous_text = None
-
-    while not dialogue_queue.empty():
-        line = dialogue_queue.get()
-        await semaphore.acquire()
-        task = asyncio.create_task(generate_audio(line, previous_text))
-        task.add_done_callback(lambda _: semaphore.release())
-        tasks.append(task)
-        previous_text = line.get("text")
-
-    logger.info(f"Starting to process {len(tasks)} audio generation tasks")
-    for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Generating audio clips"):
-        await task
-    logger.info("Completed all audio generation tasks")
+
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 429:
+            RATE_LIMITED.labels("elevenlabs").inc()
+        logger.error(f"Failed to generate audio for {speaker}: {e}")
+        logger.error(f"Response content: {e.response.text}")
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error generating audio for {speaker}: {e}")
+        raise
+
+
+class VoiceClipScheduler:
+    """Schedules TTS requests for dialogue lines as soon as they are submitted.
+
+    Lines can be submitted while the script is still being generated. How many
+    ElevenLabs requests run at once is decided by the shared ``elevenlabs_quota``,
+    under the priority class and user of the context that submits the line.
+    """
+
+    def __init__(self, output_dir: str = AUDIO_DIR):
+        self.output_dir = output_dir
+        self.tasks: List[asyncio.Task] = []
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+            logger.info(f"Created output directory: {output_dir}")
+
+    def submit(self, line: Dict[str, Any]) -> asyncio.Future:
+        """Queues a dialogue line and its overlaps; returns a future for all of its clips."""
+        line_tasks = [asyncio.create_task(generate_audio(line, self.output_dir))]
+        for overlap in line.get("overlaps", []):
+            line_tasks.append(asyncio.create_task(generate_audio(overlap, self.output_dir)))
+        self.tasks.extend(line_tasks)
+        logger.info(f"Scheduled {len(line_tasks)} audio generation tasks for {line.get('speaker')}")
+        clips_ready = asyncio.gather(*line_tasks)
+        # Callers that only use wait() drop this future; retrieve its failure so it isn't reported as unhandled
+        clips_ready.add_done_callback(lambda future: future.cancelled() or future.exception())
+        return clips_ready
+
+    async def wait(self):
+        """Waits for every submitted clip, raising the first failure."""
+        logger.info(f"Waiting for {len(self.tasks)} audio generation tasks")
+        for task in tqdm(asyncio.as_completed(self.tasks), total=len(self.tasks), desc="Generating audio clips"):
+            await task
+        logger.info("Completed all audio generation tasks")
+
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+
+
+async def generate_voice_clips(dialogue: List[Dict[str, Any]], output_dir: str = AUDIO_DIR):
+    logger.info(f"Starting voice clip generation for {len(dialogue)} dialogue segments")
+    logger.debug(f"Dialogue content: {json.dumps(dialogue, indent=2)}")
+
+    scheduler = VoiceClipScheduler(output_dir)
+    for line in dialogue:
+        scheduler.submit(line)
+    await scheduler.wait()
+
+def render_line(line: Dict[str, Any], output_dir: str = AUDIO_DIR) -> Optional[AudioSegment]:
+    """Loads the clip for a dialogue line and mixes in its overlaps."""
+    speaker = line.get("speaker")
+    text = line.get("text")
+    filename = get_clip_filename(speaker, text, output_dir)
+
+    logger.info(f"Processing clip for {speaker}: {filename}")
+
+    try:
+        clip = AudioSegment.from_mp3(filename)
+        logger.info(f"Loaded clip for {speaker}: {filename} (duration: {len(clip)}ms)")
+    except FileNotFoundError:
+        logger.error(f"Audio clip not found: {filename}")
+        return None
+    except Exception as e:
+        logger.error(f"Error loading audio clip {filename}: {e}")
+        return None
+
+    if "overlaps" in line:
+        logger.info(f"Processing overlaps for {speaker}")
+        for overlap in line.get("overlaps", []):
+            overlap_speaker = overlap.get("speaker")
+            overlap_text = overlap.get("text")
+            overlap_filename = get_clip_filename(overlap_speaker, overlap_text, output_dir)
+
+            try:
+                overlap_clip = AudioSegment.from_mp3(overlap_filename)
+                overlap_start_time = max(0, len(clip) - OVERLAP_MS)
+                clip = clip.overlay(overlap_clip, position=overlap_start_time)
+
+                if len(overlap_clip) > OVERLAP_MS:
+                    remaining_overlap = overlap_clip[OVERLAP_MS:]
+                    clip = clip.append(remaining_overlap, crossfade=0)
+                logger.info(f"Processed overlap for {overlap_speaker}: {overlap_filename}")
+            except FileNotFoundError:
+                logger.error(f"Overlap audio clip not found: {overlap_filename}")
+                continue
+            except Exception as e:
+                logger.error(f"Error processing overlap clip {overlap_filename}: {e}")
+                continue
+
+    return clip
+
+
+def get_crossfade_duration(clip_duration: int, output_duration: int) -> int:
+    if clip_duration >= CROSSFADE_MS and output_duration >= CROSSFADE_MS:
+        return min(CROSSFADE_MS, clip_duration // 2, output_duration // 2)
+    return 0
+
 
 def join_audio_clips(dialogue: List[Dict[str, Any]], output_dir: str = AUDIO_DIR, output_file: str = "final_podcast.wav"):
     output_audio = AudioSegment.silent(duration=0)
@@ -142,46 +225,11 @@ def join_audio_clips(dialogue: List[Dict[str, Any]], output_dir: str = AUDIO_DIR
     logger.debug(f"Dialogue content: {json.dumps(dialogue, indent=2)}")
 
     for line in tqdm(dialogue, desc="Joining audio clips"):
-        speaker = line.get("speaker")
-        text = line.get("text")
-        filename = get_clip_filename(speaker, text, output_dir)
-        
-        logger.info(f"Processing clip for {speaker}: {filename}")
-        
-        try:
-            clip = AudioSegment.from_mp3(filename)
-            logger.info(f"Loaded clip for {speaker}: {filename} (duration: {len(clip)}ms)")
-        except FileNotFoundError:
-            logger.error(f"Audio clip not found: {filename}")
-            continue
-        except Exception as e:
-            logger.error(f"Error loading audio clip {filename}: {e}")
+        clip = render_line(line, output_dir)
+        if clip is None:
             continue
 
-        if "overlaps" in line:
-            logger.info(f"Processing overlaps for {speaker}")
-            for overlap in line.get("overlaps", []):
-                overlap_speaker = overlap.get("speaker")
-                overlap_text = overlap.get("text")
-                overlap_filename = get_clip_filename(overlap_speaker, overlap_text, output_dir)
-                
-                try:
-                    overlap_clip = AudioSegment.from_mp3(overlap_filename)
-                    overlap_start_time = max(0, len(clip) - 850)
-                    clip = clip.overlay(overlap_clip, position=overlap_start_time)
-                    
-                    if len(overlap_clip) > 850:
-                        remaining_overlap = overlap_clip[850:]
-                        clip = clip.append(remaining_overlap, crossfade=0)
-                    logger.info(f"Processed overlap for {overlap_speaker}: {overlap_filename}")
-                except FileNotFoundError:
-                    logger.error(f"Overlap audio clip not found: {overlap_filename}")
-                    continue
-                except Exception as e:
-                    logger.error(f"Error processing overlap clip {overlap_filename}: {e}")
-                    continue
-
-        crossfade_duration = min(10, len(clip) // 2, len(output_audio) // 2) if len(clip) >= 10 and len(output_audio) >= 10 else 0
+        crossfade_duration = get_crossfade_duration(len(clip), len(output_audio))
         output_audio = output_audio.append(clip, crossfade=crossfade_duration)
         logger.info(f"Added clip to output (total duration: {len(output_audio)}ms)")
 
@@ -190,6 +238,90 @@ def join_audio_clips(dialogue: List[Dict[str, Any]], output_dir: str = AUDIO_DIR
     logger.info(f"Final audio saved to: {output_path} (duration: {len(output_audio)}ms)")
     return output_path
 
+
+class AudioStreamJoiner:
+    """Joins dialogue clips incrementally, releasing audio as soon as it is final.
+
+    Produces the same audio as ``join_audio_clips``, except that the two can
+    differ by a sample at each clip boundary: pydub positions crossfades in
+    milliseconds, rounded against the length of the whole output there and of
+    the held-back tail here. The last ``CROSSFADE_MS`` of output is held back
+    because the crossfade into the next clip rewrites it.
+    """
+
+    def __init__(self):
+        self.tail = AudioSegment.silent(duration=0)
+        self.duration = 0
+        self.format = None
+
+    def _finalize(self, segment: AudioSegment) -> bytes:
+        # The stream format is fixed by the first released segment
+        if self.format is None:
+            self.format = (segment.frame_rate, segment.channels, segment.sample_width)
+        frame_rate, channels, sample_width = self.format
+        segment = segment.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+        return segment.raw_data
+
+    def add(self, clip: AudioSegment) -> bytes:
+        """Appends a clip and returns the PCM data that can no longer change."""
+        crossfade_duration = get_crossfade_duration(len(clip), self.duration)
+        joined = self.tail.append(clip, crossfade=crossfade_duration)
+        self.duration += len(clip) - crossfade_duration
+
+        held = min(CROSSFADE_MS, len(joined))
+        self.tail = joined[len(joined) - held:]
+        return self._finalize(joined[:len(joined) - held])
+
+    def flush(self) -> bytes:
+        """Releases the held-back tail once no more clips will follow."""
+        tail, self.tail = self.tail, AudioSegment.silent(duration=0)
+        return self._finalize(tail)
+
+
+def wav_stream_header(frame_rate: int, channels: int, sample_width: int) -> bytes:
+    """Builds a WAV header for a PCM stream of unknown length."""
+    byte_rate = frame_rate * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", STREAM_DATA_SIZE, b"WAVE",
+        b"fmt ", 16, 1, channels, frame_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b"data", STREAM_DATA_SIZE,
+    )
+
+
+async def stream_dialogue_audio(lines: AsyncIterator[Tuple[Dict[str, Any], Awaitable]],
+                                output_dir: str = AUDIO_DIR) -> AsyncIterator[bytes]:
+    """Streams the joined podcast as WAV, in dialogue order, as each line's clips become ready.
+
+    ``lines`` yields dialogue lines in order along with an awaitable that resolves
+    once the clips for that line (and its overlaps) exist on disk. Clips that
+    failed to generate are skipped, as ``join_audio_clips`` does, so one failed
+    line doesn't cut off the rest of the podcast.
+    """
+    joiner = AudioStreamJoiner()
+    header_sent = False
+
+    async for line, clips_ready in lines:
+        try:
+            await clips_ready
+        except Exception as e:
+            logger.error(f"Audio generation failed for {line.get('speaker')}, streaming the clips that exist: {e}")
+        clip = await asyncio.to_thread(render_line, line, output_dir)
+        if clip is None:
+            continue
+
+        data = joiner.add(clip)
+        if not header_sent:
+            yield wav_stream_header(*joiner.format)
+            header_sent = True
+        if data:
+            yield data
+        logger.info(f"Streamed audio up to {joiner.duration}ms")
+
+    if header_sent:
+        yield joiner.flush()
+
+
 # Example usage
 if __name__ == "__main__":
     import asyncio
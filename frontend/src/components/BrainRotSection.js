@@ -25,13 +25,9 @@ const BrainRotSection = () => {
 
     const formData = new FormData();
     
-    // Create request data with fixed values
+    // Text options are left to the backend defaults, so pre-warmed videos are served from the cache
     const requestData = {
-      pdf_url: pdfUrl,
-      text_color: 'white',
-      font_size: 225,
-      duration_per_phrase: 3.0,
-      position: 'center'
+      pdf_url: pdfUrl
     };
     
     // Log the request data
@@ -36,6 +36,46 @@ const UploadSection = () => {
     return inputUrl;
   };
 
+  const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+  // starts a streamed podcast: audio plays while later lines are still being generated
+  const streamPodcast = async (body) => {
+    const response = await fetch('http://localhost:8000/generate_podcast/stream', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body),
+    });
+
+    if (!response.ok) {
+      throw new Error('Failed to start podcast generation');
+    }
+
+    const { stream_id, audio_url } = await response.json();
+    setAudioUrl(`http://localhost:8000${audio_url}`);
+
+    // poll the transcript until generation finishes
+    while (true) {
+      await sleep(2000);
+      const statusResponse = await fetch(`http://localhost:8000/podcast_streams/${stream_id}`);
+      if (!statusResponse.ok) {
+        throw new Error('Failed to get podcast status');
+      }
+
+      const data = await statusResponse.json();
+      if (data.lines > 0) {
+        setResponse(data.transcript);
+      }
+      if (data.status === 'error') {
+        throw new Error(data.error || 'Failed to generate podcast');
+      }
+      if (data.status === 'success') {
+        return;
+      }
+    }
+  };
+
   const handleFileChange = (event) => {
     const file = event.target.files[0];
     if (file) {
@@ -59,8 +99,15 @@ const UploadSection = () => {
       const convertedUrl = convertArxivUrl(url);
       console.log('Sending URL to backend:', convertedUrl);
 
-      const endpoint = action === 'summarize' ? '/query' : '/generate_podcast';
-      const response = await fetch(`http://localhost:8000${endpoint}`, {
+      if (action === 'podcast') {
+        await streamPodcast({
+          url: convertedUrl,
+          is_arxiv: true
+        });
+        return;
+      }
+
+      const response = await fetch('http://localhost:8000/query', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -77,23 +124,7 @@ const UploadSection = () => {
       }
 
       const data = await response.json();
-      
-      if (action === 'summarize') {
-        setResponse(data.answer);
-      } else {
-        if (data.status === 'error') {
-          throw new Error(data.error || 'Failed to generate podcast');
-        }
-        
-        setResponse(data.transcript);
-        if (data.audio_file) {
-          // Create a data URL from the base64 audio data
-          const audioDataUrl = `data:audio/mpeg;base64,${data.audio_file}`;
-          setAudioUrl(audioDataUrl);
-        } else {
-          throw new Error('No audio data received');
-        }
-      }
+      setResponse(data.answer);
     } catch (err) {
       console.error('Error processing URL:', err);
       setError(err.message);
@@ -120,19 +151,27 @@ const UploadSection = () => {
       });
 
       if (!uploadResponse.ok) {
-        throw new Error('Failed to upload PDF');
+        const errorData = await uploadResponse.json();
+        throw new Error(errorData.detail || 'Failed to upload PDF');
       }
 
-      const { pdf_path } = await uploadResponse.json();
+      // the uploaded paper is stored once and referenced by its document ID afterwards
+      const { document_id } = await uploadResponse.json();
+
+      if (action === 'podcast') {
+        await streamPodcast({
+          document_id: document_id
+        });
+        return;
+      }
 
-      const endpoint = action === 'summarize' ? '/query' : '/generate_podcast';
-      const response = await fetch(`http://localhost:8000${endpoint}`, {
+      const response = await fetch('http://localhost:8000/query', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          pdf_path: pdf_path
+          document_id: document_id
         }),
       });
 
@@ -142,23 +181,7 @@ const UploadSection = () => {
       }
 
       const data = await response.json();
-      
-      if (action === 'summarize') {
-        setResponse(data.answer);
-      } else {
-        if (data.status === 'error') {
-          throw new Error(data.error || 'Failed to generate podcast');
-        }
-        
-        setResponse(data.transcript);
-        if (data.audio_file) {
-          // Create a data URL from the base64 audio data
-          const audioDataUrl = `data:audio/mpeg;base64,${data.audio_file}`;
-          setAudioUrl(audioDataUrl);
-        } else {
-          throw new Error('No audio data received');
-        }
-      }
+      setResponse(data.answer);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -202,13 +225,14 @@ const UploadSection = () => {
           <Typography variant="h6" sx={{ mb: 2 }}>Generated Audio:</Typography>
           <audio 
             controls 
+            autoPlay
             style={{ width: '100%' }}
             onError={(e) => {
               console.error('Audio playback error:', e);
               setError('Failed to play audio. Please try again.');
             }}
           >
-            <source src={audioUrl} type="audio/mpeg" />
+            <source src={audioUrl} type="audio/wav" />
             Your browser does not support the audio element.
           </audio>
         </Paper>